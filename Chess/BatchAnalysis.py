@@ -0,0 +1,171 @@
+"""
+Analisis de muchas posiciones de un fichero EPD (o FEN, una por linea) con varios procesos. Las lineas se leen poco a
+poco y se mandan a los procesos en bloques, y los resultados se van escribiendo (JSONL o CSV) en el mismo orden que la
+entrada, asi ni el fichero de entrada ni los resultados tienen que caber en memoria.
+Uso: python -m Chess.BatchAnalysis posiciones.epd salida.jsonl [--depth N | --nodes N | --eval-only] [--workers N]
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from Chess import ChessEngine, SmartMoveFinder
+from Chess.UCI import moveToUCI
+
+CHUNK_SIZE = 64 # Posiciones que se mandan a cada proceso de una vez
+PENDING_CHUNKS_PER_WORKER = 4 # Bloques mandados y sin escribir por proceso (limita la memoria)
+CSV_FIELDS = ["line", "id", "fen", "eval", "bestMove", "score", "depth", "nodes", "seconds", "bm", "error"]
+
+'''
+Separa una linea EPD en el FEN y sus operaciones (por ejemplo 'bm Nf3; id "prueba 1";' -> {"bm": "Nf3", "id": "prueba 1"}).
+Tambien acepta lineas FEN completas (con los contadores de movimientos). Devuelve (fen, operaciones) o None si la linea
+esta vacia o es un comentario
+'''
+def parseEPD(line):
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("EPD no valido: " + line)
+    rest = fields[4] if len(fields) > 4 else ""
+    counters = rest.split(None, 2)
+    if len(counters) >= 2 and counters[0].isdigit() and counters[1].isdigit(): # Linea FEN completa
+        fen = " ".join(fields[:4] + counters[:2])
+        rest = counters[2] if len(counters) > 2 else ""
+    else:
+        fen = " ".join(fields[:4]) + " 0 1"
+    operations = {}
+    for operation in rest.split(';'):
+        operation = operation.strip()
+        if operation:
+            parts = operation.split(None, 1)
+            operations[parts[0]] = parts[1].strip('"') if len(parts) > 1 else ""
+    return fen, operations
+
+'''
+Analiza una posicion: evaluacion estatica (scoreBoard, positiva buena para blancas) y, si depth o nodeLimit no son None,
+busqueda con el mejor movimiento y su puntuacion (para el jugador que mueve)
+'''
+def analyzePosition(fen, depth=None, nodeLimit=None, bitboards=False):
+    gs = ChessEngine.GameState(bitboards, fen)
+    validMoves = gs.getValidMoves()
+    result = {"fen": fen, "eval": round(SmartMoveFinder.scoreBoard(gs), 3)}
+    if (depth is not None or nodeLimit is not None) and validMoves:
+        startTime = time.perf_counter()
+        bestMove = SmartMoveFinder.findBestMove(gs, validMoves, depth if depth is not None else SmartMoveFinder.MAX_DEPTH,
+                                                nodeLimit=nodeLimit, shuffle=False, useBook=False)
+        result["bestMove"] = moveToUCI(bestMove) if bestMove is not None else None
+        result["score"] = round(SmartMoveFinder.bestScore, 3)
+        result["depth"] = SmartMoveFinder.completedDepth
+        result["nodes"] = SmartMoveFinder.nodeCount
+        result["seconds"] = round(time.perf_counter() - startTime, 4)
+    return result
+
+'''
+Lo que hace cada proceso con un bloque de lineas (numero de linea, texto)
+'''
+def analyzeChunk(chunk, depth, nodeLimit, bitboards):
+    results = []
+    for lineNumber, line in chunk:
+        try:
+            parsed = parseEPD(line)
+            if parsed is None:
+                continue
+            fen, operations = parsed
+            result = {"line": lineNumber}
+            if "id" in operations:
+                result["id"] = operations["id"]
+            result.update(analyzePosition(fen, depth, nodeLimit, bitboards))
+            if "bm" in operations:
+                result["bm"] = operations["bm"]
+        except ValueError as error:
+            result = {"line": lineNumber, "error": str(error)}
+        except Exception as error: # Una linea rara nunca puede parar todo el analisis
+            result = {"line": lineNumber, "error": "%s: %s" % (type(error).__name__, error)}
+        results.append(result)
+    return results
+
+'''
+Lee el fichero por bloques de CHUNK_SIZE lineas
+'''
+def readChunks(inputFile):
+    chunk = []
+    for lineNumber, line in enumerate(inputFile, 1):
+        chunk.append((lineNumber, line))
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+'''
+Analiza todas las posiciones de inputFile y llama a write(result) con cada resultado en orden. Nunca hay mas de
+PENDING_CHUNKS_PER_WORKER bloques por proceso esperando. Devuelve el numero de posiciones analizadas
+'''
+def analyzeFile(inputFile, write, depth=None, nodeLimit=None, workers=None, bitboards=False):
+    workers = workers or os.cpu_count() or 1
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in readChunks(inputFile):
+            pending.append(pool.submit(analyzeChunk, chunk, depth, nodeLimit, bitboards))
+            if len(pending) >= workers * PENDING_CHUNKS_PER_WORKER:
+                for result in pending.popleft().result():
+                    write(result)
+                    count += 1
+        while pending:
+            for result in pending.popleft().result():
+                write(result)
+                count += 1
+    return count
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.BatchAnalysis",
+                                     description="Analisis en paralelo de las posiciones de un fichero EPD")
+    parser.add_argument("input", help="fichero EPD o FEN (una posicion por linea, - para la entrada estandar)")
+    parser.add_argument("output", help="fichero de resultados (.jsonl o .csv, - para la salida estandar)")
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument("--depth", type=int, help="buscar a esta profundidad")
+    limit.add_argument("--nodes", type=int, help="buscar hasta este numero de nodos")
+    limit.add_argument("--eval-only", action="store_true", help="solo la evaluacion estatica, sin buscar")
+    parser.add_argument("--workers", type=int, default=None, help="numero de procesos (por defecto uno por nucleo)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None,
+                        help="formato de salida (por defecto segun la extension)")
+    parser.add_argument("--bitboards", action="store_true", help="generar los movimientos con bitboards")
+    args = parser.parse_args(argv)
+
+    depth = args.depth
+    if depth is None and args.nodes is None and not args.eval_only:
+        depth = SmartMoveFinder.MOVEMENT_DEPTH
+    outputFormat = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+
+    inputFile = sys.stdin if args.input == "-" else open(args.input)
+    outputFile = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    if outputFormat == "csv":
+        writer = csv.DictWriter(outputFile, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(result):
+            outputFile.write(json.dumps(result) + "\n")
+
+    startTime = time.perf_counter()
+    try:
+        count = analyzeFile(inputFile, write, depth, args.nodes, args.workers, args.bitboards)
+    finally:
+        if inputFile is not sys.stdin:
+            inputFile.close()
+        if outputFile is not sys.stdout:
+            outputFile.close()
+    seconds = time.perf_counter() - startTime
+    print("%d posiciones en %.2fs (%.1f posiciones/s)" % (count, seconds, count / seconds if seconds else 0),
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
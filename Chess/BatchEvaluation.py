@@ -0,0 +1,137 @@
+"""
+Evaluacion de muchas posiciones a la vez con NumPy (para ajustar la evaluacion o analizar miles de posiciones). Cada
+posicion se codifica como un array int8 de 64 casillas (0 vacia, 1-12 la pieza segun PIECES) o como 12 planos de 8x8, y
+el material y la posicion de todo el lote se suman con operaciones vectorizadas sobre las tablas de Evaluation apiladas
+en un solo array. Da exactamente lo mismo que SmartMoveFinder.scoreBoard.
+NumPy solo hace falta para este modulo. Uso del benchmark: python -m Chess.BatchEvaluation [--positions N]
+"""
+
+import numpy as np
+from Chess.Evaluation import MATERIAL_SCORES, POSITION_SCORES
+from Chess.SmartMoveFinder import CHECKMATE_POINTS, STALEMATE_POINTS
+
+PIECES = ('wp', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bp', 'bN', 'bB', 'bR', 'bQ', 'bK')
+PIECE_CODES = {piece: i + 1 for i, piece in enumerate(PIECES)}
+PIECE_CODES["--"] = 0
+
+# Tablas apiladas (13, 64): fila 0 para las casillas vacias y una fila por pieza. Enteros como en GameState, la posicion se
+# multiplica por .1 al final para que el resultado sea el mismo que el de scoreBoard
+MATERIAL_TABLE = np.zeros((len(PIECES) + 1, 64), dtype=np.int32)
+POSITION_TABLE = np.zeros((len(PIECES) + 1, 64), dtype=np.int32)
+for piece, code in PIECE_CODES.items():
+    if code:
+        MATERIAL_TABLE[code, :] = MATERIAL_SCORES[piece]
+        POSITION_TABLE[code, :] = POSITION_SCORES[piece]
+SQUARES = np.arange(64)
+
+'''
+Codifica una lista de tableros (GameState.board) en un array (N, 64) int8
+'''
+def encodeBoards(boards):
+    codes = np.empty((len(boards), 64), dtype=np.int8)
+    for i, board in enumerate(boards):
+        codes[i] = [PIECE_CODES[square] for row in board for square in row]
+    return codes
+
+'''
+Pasa de (N, 64) a 12 planos (N, 12, 8, 8) int8 con un 1 donde esta cada pieza
+'''
+def codesToPlanes(codes):
+    pieceCodes = np.arange(1, len(PIECES) + 1, dtype=np.int8)
+    planes = codes[:, None, :] == pieceCodes[None, :, None]
+    return planes.astype(np.int8).reshape(len(codes), len(PIECES), 8, 8)
+
+'''
+Puntuacion (positiva buena para blancas) de un lote codificado como (N, 64)
+'''
+def scoreCodes(codes):
+    indexes = codes.astype(np.intp)
+    material = MATERIAL_TABLE[indexes, SQUARES].sum(axis=1, dtype=np.int64)
+    position = POSITION_TABLE[indexes, SQUARES].sum(axis=1, dtype=np.int64)
+    return material + position * .1
+
+'''
+Puntuacion de un lote codificado como planos (N, 12, 8, 8)
+'''
+def scorePlanes(planes):
+    planes = planes.reshape(len(planes), len(PIECES), 64).astype(np.int64)
+    material = np.einsum('npq,pq->n', planes, MATERIAL_TABLE[1:].astype(np.int64))
+    position = np.einsum('npq,pq->n', planes, POSITION_TABLE[1:].astype(np.int64))
+    return material + position * .1
+
+'''
+Igual que scoreBoard para cada GameState de la lista: los jaques mate y ahogados (segun los flags que deja
+getValidMoves) se puntuan igual que en scoreBoard y el resto con scoreCodes
+'''
+def scoreBoards(gameStates):
+    scores = scoreCodes(encodeBoards([gs.board for gs in gameStates]))
+    for i, gs in enumerate(gameStates):
+        if gs.checkmate:
+            scores[i] = -CHECKMATE_POINTS if gs.whiteToMove else CHECKMATE_POINTS
+        elif gs.stalemate:
+            scores[i] = STALEMATE_POINTS
+    return scores
+
+'''
+Posiciones de partidas con movimientos aleatorios para el benchmark
+'''
+def randomPositions(count, seed=0):
+    import random
+    from Chess import ChessEngine
+
+    rng = random.Random(seed)
+    positions = []
+    gs = ChessEngine.GameState()
+    while len(positions) < count:
+        validMoves = gs.getValidMoves()
+        if not validMoves or len(gs.moveLog) >= 80:
+            gs = ChessEngine.GameState()
+            continue
+        gs.makeMove(rng.choice(validMoves))
+        state = ChessEngine.GameState(fen=gs.getFEN())
+        state.getValidMoves()
+        positions.append(state)
+    return positions
+
+'''
+Compara la evaluacion posicion a posicion (scoreBoardFullScan, recorriendo el tablero) con la del lote
+'''
+def main(argv=None):
+    import argparse
+    import time
+    from Chess import SmartMoveFinder
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.BatchEvaluation",
+                                     description="Evaluacion por lotes con NumPy frente a la evaluacion una a una")
+    parser.add_argument("--positions", type=int, default=20000, help="numero de posiciones")
+    args = parser.parse_args(argv)
+
+    positions = randomPositions(args.positions)
+
+    startTime = time.perf_counter()
+    scalarScores = [SmartMoveFinder.scoreBoardFullScan(gs) for gs in positions]
+    scalarSeconds = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    codes = encodeBoards([gs.board for gs in positions])
+    encodeSeconds = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    batchScores = scoreCodes(codes)
+    batchSeconds = time.perf_counter() - startTime
+    planes = codesToPlanes(codes)
+    startTime = time.perf_counter()
+    planeScores = scorePlanes(planes)
+    planeSeconds = time.perf_counter() - startTime
+
+    scores = scoreBoards(positions)
+    mismatches = sum(1 for i in range(len(positions)) if scores[i] != scalarScores[i])
+    mismatches += int(np.count_nonzero(batchScores != planeScores))
+    count = len(positions)
+    print("Una a una:        %8.3fs %10.0f posiciones/s" % (scalarSeconds, count / scalarSeconds))
+    print("Codificar (N,64): %8.3fs %10.0f posiciones/s" % (encodeSeconds, count / encodeSeconds))
+    print("Lote (N,64):      %8.3fs %10.0f posiciones/s" % (batchSeconds, count / batchSeconds))
+    print("Lote (N,12,8,8):  %8.3fs %10.0f posiciones/s" % (planeSeconds, count / planeSeconds))
+    print("Diferencias con scoreBoard: %d" % mismatches)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Variante de GameState que guarda la posicion tambien en bitboards: un entero de 64 bits por cada tipo de pieza (12 en
+total), donde el bit fila * 8 + columna esta a 1 si hay una pieza de ese tipo en la casilla. Los ataques de caballo, rey
+y peon estan precalculados en tablas y los de las piezas que se deslizan se sacan de tablas de rayos.
+Tiene la misma interfaz que GameState (makeMove, undoMove, getValidMoves, moveLog, board...) para que SmartMoveFinder y
+ChessMain puedan usar cualquiera de las dos. Se crea con ChessEngine.GameState(bitboards=True).
+Lo que gana es la generacion de movimientos: en perft (python -m Chess.Perft --bitboards) va del orden de 1.2-1.3 veces
+mas rapido que GameState. makeMove y undoMove siguen actualizando tambien la lista board, que hace falta para saber que
+pieza hay en cada casilla (Move, la ventana); eso es sobre un 10% del tiempo de perft, asi que quitarla no cambiaria mucho.
+"""
+
+from Chess.ChessEngine import GameState, Move
+
+ALL_SQUARES = (1 << 64) - 1
+PIECES = ('wp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bp', 'bR', 'bN', 'bB', 'bQ', 'bK')
+
+# Las 4 primeras direcciones son de torre y las 4 ultimas de alfil (mismo orden que checkForPinsAndChecks)
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+# Direcciones en las que el indice de la casilla crece (el primer bloqueador es el bit mas bajo)
+POSITIVE_DIRECTIONS = tuple(d[0] * 8 + d[1] > 0 for d in DIRECTIONS)
+
+'''
+Precalcula para cada casilla el bitboard de las casillas a las que se llega con los saltos dados
+'''
+def buildJumpTable(jumps):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        for dr, dc in jumps:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+                bb |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(bb)
+    return table
+
+'''
+Precalcula para cada direccion y casilla el rayo de casillas hasta el borde del tablero (sin incluir la casilla)
+'''
+def buildRayTable():
+    rays = []
+    for dr, dc in DIRECTIONS:
+        table = []
+        for sq in range(64):
+            r, c = divmod(sq, 8)
+            bb = 0
+            r += dr
+            c += dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                bb |= 1 << (r * 8 + c)
+                r += dr
+                c += dc
+            table.append(bb)
+        rays.append(table)
+    return rays
+
+KNIGHT_ATTACKS = buildJumpTable(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = buildJumpTable(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# Casillas que ataca un peon de cada color (los blancos atacan hacia la fila 0)
+PAWN_ATTACKS = {'w': buildJumpTable(((-1, -1), (-1, 1))), 'b': buildJumpTable(((1, -1), (1, 1)))}
+RAYS = buildRayTable()
+
+'''
+Casilla del primer bloqueador de un rayo en la direccion d
+'''
+def firstBlocker(d, blockers):
+    if POSITIVE_DIRECTIONS[d]:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+'''
+Casillas atacadas desde sq en la direccion d (incluye la casilla del primer bloqueador)
+'''
+def rayAttacks(d, sq, occupied):
+    ray = RAYS[d][sq]
+    blockers = ray & occupied
+    if blockers:
+        ray ^= RAYS[d][firstBlocker(d, blockers)]
+    return ray
+
+# (tabla de rayos, si la direccion es creciente) de las direcciones de torre y de alfil, para rookAttacks y bishopAttacks
+ROOK_RAYS = tuple((RAYS[d], POSITIVE_DIRECTIONS[d]) for d in range(4))
+BISHOP_RAYS = tuple((RAYS[d], POSITIVE_DIRECTIONS[d]) for d in range(4, 8))
+
+'''
+Casillas atacadas desde sq en las direcciones de rays. Es rayAttacks para varias direcciones sin llamar a una funcion por
+cada una (se usa en cada nodo de la busqueda)
+'''
+def slidingAttacks(sq, occupied, rays):
+    attacks = 0
+    for table, positive in rays:
+        ray = table[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= table[(blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+def rookAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, ROOK_RAYS)
+
+def bishopAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, BISHOP_RAYS)
+
+'''
+Recorre las casillas (indices) de un bitboard
+'''
+def squares(bb):
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+class BitboardGameState(GameState):
+    def __init__(self, bitboards=True, fen=None):
+        super().__init__(fen=fen)
+        self.initBitboards()
+
+    """
+    Construye los bitboards a partir de self.board. Hay que llamarlo si se cambia el tablero sin usar makeMove
+    """
+    def initBitboards(self):
+        # Un bitboard por pieza ("wp", "bK"...) y uno con todas las piezas de cada color
+        self.pieceBitboards = {piece: 0 for piece in PIECES}
+        self.colorBitboards = {'w': 0, 'b': 0}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    self.pieceBitboards[piece] |= 1 << (r * 8 + c)
+                    self.colorBitboards[piece[0]] |= 1 << (r * 8 + c)
+
+    def loadFEN(self, fen):
+        super().loadFEN(fen)
+        self.initBitboards()
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.toggleMoveBitboards(move)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            super().undoMove()
+            self.toggleMoveBitboards(move)
+
+    """
+    Aplica el movimiento a los bitboards con XOR. Como el XOR se deshace a si mismo, la misma funcion sirve para hacer
+    y deshacer el movimiento
+    """
+    def toggleMoveBitboards(self, move):
+        pieceBitboards = self.pieceBitboards
+        colorBitboards = self.colorBitboards
+        color = move.pieceMoved[0]
+        startBit = 1 << (move.startRow * 8 + move.startCol)
+        endBit = 1 << (move.endRow * 8 + move.endCol)
+        if move.isPawnPromotion: # El peon desaparece y aparece una reina
+            pieceBitboards[move.pieceMoved] ^= startBit
+            pieceBitboards[color + 'Q'] ^= endBit
+        else:
+            pieceBitboards[move.pieceMoved] ^= startBit | endBit
+        colorBitboards[color] ^= startBit | endBit
+        if move.pieceCaptured != '--':
+            if move.isEnpassantMove: # El peon capturado esta al lado de la casilla de origen
+                captureBit = 1 << (move.startRow * 8 + move.endCol)
+            else:
+                captureBit = endBit
+            pieceBitboards[move.pieceCaptured] ^= captureBit
+            colorBitboards[move.pieceCaptured[0]] ^= captureBit
+        if move.isCastleMove:
+            if move.endCol - move.startCol == 2: # Lado del rey, la torre va de la columna 7 a la 5
+                rookBits = (1 << (move.endRow * 8 + 7)) | (1 << (move.endRow * 8 + 5))
+            else: # Lado de la reina, la torre va de la columna 0 a la 3
+                rookBits = (1 << (move.endRow * 8)) | (1 << (move.endRow * 8 + 3))
+            pieceBitboards[color + 'R'] ^= rookBits
+            colorBitboards[color] ^= rookBits
+
+    """
+    Bitboard de las piezas del color byColor que atacan la casilla sq con las piezas de occupied en el tablero
+    """
+    def attackersOf(self, sq, byColor, occupied):
+        pieceBitboards = self.pieceBitboards
+        otherColor = 'b' if byColor == 'w' else 'w'
+        queens = pieceBitboards[byColor + 'Q']
+        # Un peon de byColor ataca sq si esta en una casilla que atacaria un peon del otro color puesto en sq
+        attackers = (PAWN_ATTACKS[otherColor][sq] & pieceBitboards[byColor + 'p']) | \
+                    (KNIGHT_ATTACKS[sq] & pieceBitboards[byColor + 'N']) | \
+                    (KING_ATTACKS[sq] & pieceBitboards[byColor + 'K']) | \
+                    (rookAttacks(sq, occupied) & (pieceBitboards[byColor + 'R'] | queens)) | \
+                    (bishopAttacks(sq, occupied) & (pieceBitboards[byColor + 'B'] | queens))
+        return attackers & occupied
+
+    def isAttacked(self, square, byColor):
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        return self.attackersOf(square[0] * 8 + square[1], byColor, occupied) != 0
+
+    """
+    Todos los movimientos considerando jaque, generados con los bitboards
+    """
+    def generateValidMoves(self):
+        moves = self.generateMoves(False)
+        # Sin movimientos es jaque mate o estancamiento (rey ahogado). Se ponen siempre los dos flags, si no se quedaria
+        # puesto el de la ultima posicion sin movimientos (por ejemplo un mate seguido de un ahogado)
+        self.checkmate = len(moves) == 0 and self.inCheck
+        self.stalemate = len(moves) == 0 and not self.inCheck
+        return moves
+
+    """
+    Solo las capturas (y promociones) legales, para la busqueda de quiescencia
+    """
+    def getCaptureMoves(self):
+        return self.generateMoves(True)
+
+    """
+    Genera los movimientos legales. Con capturesOnly solo las capturas y promociones
+    """
+    def generateMoves(self, capturesOnly):
+        pieceBitboards = self.pieceBitboards
+        if self.whiteToMove:
+            ally, enemy = 'w', 'b'
+            kingRow, kingCol = self.whiteKingLocation
+        else:
+            ally, enemy = 'b', 'w'
+            kingRow, kingCol = self.blackKingLocation
+        allyBitboard = self.colorBitboards[ally]
+        enemyBitboard = self.colorBitboards[enemy]
+        occupied = allyBitboard | enemyBitboard
+        empty = ~occupied & ALL_SQUARES
+        kingSq = kingRow * 8 + kingCol
+        board = self.board
+        moves = []
+
+        # Jaques y casillas a las que hay que ir para taparlos o capturar la pieza que da jaque
+        checkers = self.attackersOf(kingSq, enemy, occupied)
+        self.inCheck = checkers != 0
+        self.checks = []
+        checkMask = ALL_SQUARES
+        for checkSq in squares(checkers):
+            checkRow, checkCol = divmod(checkSq, 8)
+            checkMask = 1 << checkSq
+            for d in range(8):
+                if (RAYS[d][kingSq] >> checkSq) & 1: # Pieza en linea con el rey, se puede tapar
+                    checkMask = RAYS[d][kingSq] ^ RAYS[d][checkSq]
+                    self.checks.append((checkRow, checkCol, DIRECTIONS[d][0], DIRECTIONS[d][1]))
+                    break
+            else: # Caballo
+                self.checks.append((checkRow, checkCol, checkRow - kingRow, checkCol - kingCol))
+        if len(self.checks) > 1: # Con jaque doble solo se puede mover el rey
+            checkMask = 0
+
+        # Piezas clavadas: la primera pieza del rayo es aliada y la siguiente una torre, alfil o reina enemiga
+        self.pins = []
+        pinMasks = {}
+        rookSliders = pieceBitboards[enemy + 'R'] | pieceBitboards[enemy + 'Q']
+        bishopSliders = pieceBitboards[enemy + 'B'] | pieceBitboards[enemy + 'Q']
+        for d in range(8):
+            ray = RAYS[d][kingSq]
+            if not ray & (rookSliders if d < 4 else bishopSliders): # Sin torre, alfil o reina en el rayo no hay clavada
+                continue
+            blockers = ray & occupied
+            first = firstBlocker(d, blockers)
+            if not (allyBitboard >> first) & 1:
+                continue
+            beyond = RAYS[d][first] & occupied
+            if not beyond:
+                continue
+            second = firstBlocker(d, beyond)
+            if ((rookSliders if d < 4 else bishopSliders) >> second) & 1:
+                pinMasks[first] = RAYS[d][kingSq] ^ RAYS[d][second]
+                self.pins.append((first // 8, first % 8, DIRECTIONS[d][0], DIRECTIONS[d][1]))
+
+        kingTargets = enemyBitboard if capturesOnly else ~allyBitboard
+        targets = kingTargets & checkMask
+        if checkMask:
+            # Peones
+            forward = -8 if ally == 'w' else 8
+            startRow = 6 if ally == 'w' else 1
+            lastRow = 0 if ally == 'w' else 7
+            epSq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1] if self.enpassantPossible != () else -1
+            for sq in squares(pieceBitboards[ally + 'p']):
+                startSq = divmod(sq, 8)
+                mask = checkMask & pinMasks.get(sq, ALL_SQUARES)
+                oneSq = sq + forward
+                if (empty >> oneSq) & 1:
+                    if (mask >> oneSq) & 1 and (not capturesOnly or oneSq // 8 == lastRow):
+                        moves.append(Move(startSq, divmod(oneSq, 8), board))
+                    twoSq = oneSq + forward
+                    if not capturesOnly and startSq[0] == startRow and (empty >> twoSq) & 1 and (mask >> twoSq) & 1:
+                        moves.append(Move(startSq, divmod(twoSq, 8), board))
+                for endSq in squares(PAWN_ATTACKS[ally][sq] & enemyBitboard & mask):
+                    moves.append(Move(startSq, divmod(endSq, 8), board))
+                if epSq >= 0 and (PAWN_ATTACKS[ally][sq] >> epSq) & 1:
+                    # Quitamos los dos peones y ponemos el nuestro en la casilla final para ver si el rey queda atacado
+                    capturedSq = startSq[0] * 8 + epSq % 8
+                    afterOccupied = occupied ^ (1 << sq) ^ (1 << capturedSq) ^ (1 << epSq)
+                    if not self.attackersOf(kingSq, enemy, afterOccupied):
+                        moves.append(Move(startSq, divmod(epSq, 8), board, isEnpassantMove = True))
+            # Caballos (uno clavado no se puede mover nunca)
+            for sq in squares(pieceBitboards[ally + 'N']):
+                if sq in pinMasks:
+                    continue
+                startSq = divmod(sq, 8)
+                for endSq in squares(KNIGHT_ATTACKS[sq] & targets):
+                    moves.append(Move(startSq, divmod(endSq, 8), board))
+            # Alfiles, torres y reinas
+            for piece, attacksFunction in ((ally + 'B', bishopAttacks), (ally + 'R', rookAttacks),
+                                           (ally + 'Q', bishopAttacks), (ally + 'Q', rookAttacks)):
+                for sq in squares(pieceBitboards[piece]):
+                    startSq = divmod(sq, 8)
+                    mask = targets & pinMasks.get(sq, ALL_SQUARES)
+                    for endSq in squares(attacksFunction(sq, occupied) & mask):
+                        moves.append(Move(startSq, divmod(endSq, 8), board))
+
+        # Rey: se quita del tablero para que no tape los ataques en la linea del jaque
+        withoutKing = occupied ^ (1 << kingSq)
+        for endSq in squares(KING_ATTACKS[kingSq] & kingTargets):
+            if not self.attackersOf(endSq, enemy, withoutKing):
+                moves.append(Move((kingRow, kingCol), divmod(endSq, 8), board))
+        if not self.inCheck and not capturesOnly:
+            self.getCastleMoves(kingRow, kingCol, moves)
+        return moves
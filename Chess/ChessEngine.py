@@ -2,8 +2,35 @@
 Esta clase es responsable de almacenar toda la información sobre el estado actual de una partida de ajedrez. También
 será responsable de determinar los movimientos válidos en el estado actual y llevar un registro de los movimientos.
 """
+
+import random
+from Chess.Evaluation import MATERIAL_SCORES, POSITION_SCORES
+from Chess.MoveCache import MoveCache
+
+# Claves aleatorias de 64 bits para el hash Zobrist de la posicion (semilla fija para que sean siempre las mismas)
+zobristRandom = random.Random(20240611)
+ZOBRIST_PIECES = {piece: [zobristRandom.getrandbits(64) for sq in range(64)]
+                  for piece in ('wp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bp', 'bR', 'bN', 'bB', 'bQ', 'bK')}
+ZOBRIST_CASTLE = [zobristRandom.getrandbits(64) for i in range(16)] # Una clave por combinacion de derechos de enroque
+ZOBRIST_ENPASSANT = [zobristRandom.getrandbits(64) for col in range(8)] # Una clave por columna del en passant
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+DEBUG_ZOBRIST = False # Comprobar en cada makeMove/undoMove que la clave coincide con la calculada desde cero
+MOVE_CACHE_SIZE = 4096 # Posiciones en la cache de movimientos validos de cada GameState (0 para no usar cache)
+DEBUG_EVALUATION = False # Comprobar en cada makeMove/undoMove que la puntuacion coincide con la de recorrer el tablero
+
 class GameState():
-    def __init__(self):
+    """
+    Con GameState(bitboards=True) se crea la variante con bitboards (BitboardEngine.BitboardGameState), que tiene la
+    misma interfaz pero genera los movimientos con operaciones de bits. Con fen se empieza en esa posicion en vez de en la
+    inicial
+    """
+    def __new__(cls, bitboards=False, fen=None):
+        if bitboards and cls is GameState:
+            from Chess.BitboardEngine import BitboardGameState # Import aqui para no tener un import circular
+            cls = BitboardGameState
+        return super().__new__(cls)
+
+    def __init__(self, bitboards=False, fen=None):
         # Tablero de 8x8 (lista 2D), cada elemento de la lista tiene 2 caracteres.
         # El primer caracter representa el color de la pieza (b para negro y w para blanco), el segundo caracter
         # representa el tipo de pieza (R para torre, N para caballo, B para alfil, Q para reina y K para rey)
@@ -32,17 +59,136 @@ class GameState():
         self.checkmate = False
         # El rey no tiene movimientos validos pero no está en jaque
         self.stalemate = False
+        # Informacion del rey del jugador que mueve (se calcula en getValidMoves)
+        self.inCheck = False
+        self.pins = []
+        self.checks = []
         self.enpassantPossible = () # Coordeandas para la casilla donde en passant es posible
         self.enPassantPossibleLog = [self.enpassantPossible]
 
         self.currentCastlingRight = CastleRights(True, True, True, True)
         self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
                                              self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)]
+        # Hash Zobrist de la posicion, se actualiza en makeMove y se recupera del log en undoMove
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+        # Puntuacion de material y de posicion de la IA (ver Evaluation), se actualizan en makeMove y undoMove
+        self.materialScore, self.positionScore = self.computeScores()
+        self.pieceCount = self.countPieces() # Piezas en el tablero (con los reyes), baja en cada captura
+        # Movimientos validos de las ultimas posiciones por clave Zobrist (ver MoveCache)
+        self.moveCache = MoveCache(MOVE_CACHE_SIZE) if MOVE_CACHE_SIZE > 0 else None
+        if fen is not None:
+            self.loadFEN(fen)
+
+    """
+    Cargar una posicion en notacion FEN (por ejemplo "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1").
+    Se borra el registro de movimientos, la posicion cargada pasa a ser la inicial
+    """
+    def loadFEN(self, fen):
+        fields = fen.split()
+        if not 1 <= len(fields) <= 6:
+            raise ValueError("FEN no valido: " + fen)
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError("FEN no valido: " + fen)
+        board = []
+        for r in range(8):
+            row = []
+            for char in rows[r]:
+                if char.isdigit(): # Numero de casillas vacias
+                    row.extend(["--"] * int(char))
+                elif char.lower() in "prnbqk":
+                    if char.lower() == 'p' and r in (0, 7): # No puede haber peones en la primera ni en la ultima fila
+                        raise ValueError("FEN no valido (peon en la fila 1 u 8): " + fen)
+                    color = 'w' if char.isupper() else 'b'
+                    row.append(color + ('p' if char.lower() == 'p' else char.upper()))
+                    if char == 'K':
+                        whiteKingLocation = (r, len(row) - 1)
+                    elif char == 'k':
+                        blackKingLocation = (r, len(row) - 1)
+                else:
+                    raise ValueError("FEN no valido: " + fen)
+            if len(row) != 8:
+                raise ValueError("FEN no valido: " + fen)
+            board.append(row)
+        if fields[0].count('K') != 1 or fields[0].count('k') != 1 or (len(fields) > 1 and fields[1] not in ('w', 'b')):
+            raise ValueError("FEN no valido: " + fen)
+        whiteToMove = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        # Cada enroque solo puede estar una vez y con el rey y la torre en sus casillas iniciales
+        if castling != '-':
+            castlingSquares = {'K': ((7, 4), (7, 7), 'w'), 'Q': ((7, 4), (7, 0), 'w'),
+                               'k': ((0, 4), (0, 7), 'b'), 'q': ((0, 4), (0, 0), 'b')}
+            for char in castling:
+                if char not in castlingSquares or castling.count(char) > 1:
+                    raise ValueError("FEN no valido (enroques): " + fen)
+                (kingRow, kingCol), (rookRow, rookCol), color = castlingSquares[char]
+                if board[kingRow][kingCol] != color + 'K' or board[rookRow][rookCol] != color + 'R':
+                    raise ValueError("FEN no valido (enroques): " + fen)
+        enpassant = fields[3] if len(fields) > 3 else '-'
+        # La casilla de captura al paso esta en la fila 6 si mueven las blancas y en la 3 si mueven las negras
+        if enpassant != '-' and (len(enpassant) != 2 or enpassant[0] not in Move.filesToCols or
+                                 enpassant[1] != ('6' if whiteToMove else '3')):
+            raise ValueError("FEN no valido (captura al paso): " + fen)
+        # A partir de aqui la posicion es valida y ya se puede cambiar el GameState
+        self.board = board
+        self.whiteKingLocation = whiteKingLocation
+        self.blackKingLocation = blackKingLocation
+        self.whiteToMove = whiteToMove
+        self.currentCastlingRight = CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+        self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
+                                             self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)]
+        if enpassant != '-':
+            self.enpassantPossible = (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]])
+        else:
+            self.enpassantPossible = ()
+        self.enPassantPossibleLog = [self.enpassantPossible]
+        self.moveLog = []
+        self.checkmate = False
+        self.stalemate = False
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+        # Puntuacion de material y de posicion de la IA (ver Evaluation), se actualizan en makeMove y undoMove
+        self.materialScore, self.positionScore = self.computeScores()
+        self.pieceCount = self.countPieces()
+
+    """
+    Devuelve la posicion actual en notacion FEN. No se lleva la cuenta de la regla de los 50 movimientos, asi que ese
+    campo siempre es 0, y el numero de movimiento se cuenta desde la posicion inicial cargada
+    """
+    def getFEN(self):
+        rows = []
+        for row in self.board:
+            fenRow = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    fenRow += str(empty)
+                    empty = 0
+                char = 'p' if square[1] == 'p' else square[1].lower()
+                fenRow += char.upper() if square[0] == 'w' else char
+            if empty:
+                fenRow += str(empty)
+            rows.append(fenRow)
+        rights = self.currentCastlingRight
+        castling = ('K' if rights.wks else '') + ('Q' if rights.wqs else '') + ('k' if rights.bks else '') + \
+                   ('q' if rights.bqs else '')
+        if self.enpassantPossible:
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        else:
+            enpassant = '-'
+        return "%s %s %s %s 0 %d" % ('/'.join(rows), 'w' if self.whiteToMove else 'b', castling or '-', enpassant,
+                                     1 + len(self.moveLog) // 2)
 
     """
     Coge un movimiento como parametro y lo ejecuta
     """
     def makeMove(self, move):
+        oldEnpassantPossible = self.enpassantPossible
+        oldCastleRightsIndex = self.currentCastlingRight.index()
         # Actualiza el tablero con el movimiento realizado
         self.board[move.startRow][move.startCol] = "--" # La casilla de origen se convierte en vacía
         self.board[move.endRow][move.endCol] = move.pieceMoved # La pieza se mueve a la casilla de destino
@@ -80,6 +226,16 @@ class GameState():
         self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
                                              self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
 
+        self.zobristKey = self.updateZobristKey(move, oldEnpassantPossible, oldCastleRightsIndex)
+        self.zobristLog.append(self.zobristKey)
+        if DEBUG_ZOBRIST:
+            assert self.zobristKey == self.computeZobristKey(), "Clave Zobrist incorrecta tras " + str(move)
+        self.updateScores(move, 1)
+        if move.pieceCaptured != '--':
+            self.pieceCount -= 1
+        if DEBUG_EVALUATION:
+            assert (self.materialScore, self.positionScore) == self.computeScores(), "Puntuacion incorrecta tras " + str(move)
+
     """
     Deshacer el ultimo movimiento hecho
     """
@@ -114,10 +270,118 @@ class GameState():
                     self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
                     self.board[move.endRow][move.endCol + 1] = '--'
 
+            self.zobristLog.pop()
+            self.zobristKey = self.zobristLog[-1]
+            if DEBUG_ZOBRIST:
+                assert self.zobristKey == self.computeZobristKey(), "Clave Zobrist incorrecta al deshacer " + str(move)
+            self.updateScores(move, -1)
+            if move.pieceCaptured != '--':
+                self.pieceCount += 1
+            if DEBUG_EVALUATION:
+                assert (self.materialScore, self.positionScore) == self.computeScores(), \
+                    "Puntuacion incorrecta al deshacer " + str(move)
+
             # Para asegurarse que al ir atrás no se quede el estado
             self.checkmate = False
             self.stalemate = False
 
+    """
+    Actualiza la clave Zobrist con XOR solo para lo que cambia con el movimiento (piezas, derechos de enroque, columna del
+    en passant y turno). Recibe el en passant y los derechos de enroque que habia antes del movimiento
+    """
+    def updateZobristKey(self, move, oldEnpassantPossible, oldCastleRightsIndex):
+        key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        key ^= ZOBRIST_PIECES[move.pieceMoved][startSq]
+        if move.isPawnPromotion:
+            key ^= ZOBRIST_PIECES[move.pieceMoved[0] + 'Q'][endSq]
+        else:
+            key ^= ZOBRIST_PIECES[move.pieceMoved][endSq]
+        if move.pieceCaptured != '--':
+            if move.isEnpassantMove: # El peon capturado esta en la fila de origen
+                key ^= ZOBRIST_PIECES[move.pieceCaptured][move.startRow * 8 + move.endCol]
+            else:
+                key ^= ZOBRIST_PIECES[move.pieceCaptured][endSq]
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + 'R'
+            if move.endCol - move.startCol == 2: # Lado del rey
+                key ^= ZOBRIST_PIECES[rook][move.endRow * 8 + 7] ^ ZOBRIST_PIECES[rook][move.endRow * 8 + 5]
+            else: # Lado de la reina
+                key ^= ZOBRIST_PIECES[rook][move.endRow * 8] ^ ZOBRIST_PIECES[rook][move.endRow * 8 + 3]
+        if oldEnpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[oldEnpassantPossible[1]]
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        castleRightsIndex = self.currentCastlingRight.index()
+        if castleRightsIndex != oldCastleRightsIndex:
+            key ^= ZOBRIST_CASTLE[oldCastleRightsIndex] ^ ZOBRIST_CASTLE[castleRightsIndex]
+        return key
+
+    """
+    Calcula la clave Zobrist desde cero recorriendo todo el tablero
+    """
+    def computeZobristKey(self):
+        key = ZOBRIST_CASTLE[self.currentCastlingRight.index()]
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        if self.enpassantPossible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassantPossible[1]]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key
+
+    """
+    Suma (sign = 1, al hacer el movimiento) o resta (sign = -1, al deshacerlo) lo que cambia la puntuacion de material y
+    de posicion con el movimiento: la pieza que se mueve, la capturada, la promocion a reina y la torre del enroque
+    """
+    def updateScores(self, move, sign):
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        material = 0
+        position = -POSITION_SCORES[move.pieceMoved][startSq]
+        if move.isPawnPromotion:
+            queen = move.pieceMoved[0] + 'Q'
+            material += MATERIAL_SCORES[queen] - MATERIAL_SCORES[move.pieceMoved]
+            position += POSITION_SCORES[queen][endSq]
+        else:
+            position += POSITION_SCORES[move.pieceMoved][endSq]
+        if move.pieceCaptured != '--':
+            captureSq = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq
+            material -= MATERIAL_SCORES[move.pieceCaptured]
+            position -= POSITION_SCORES[move.pieceCaptured][captureSq]
+        if move.isCastleMove:
+            rookScores = POSITION_SCORES[move.pieceMoved[0] + 'R']
+            if move.endCol - move.startCol == 2: # Lado del rey
+                position += rookScores[move.endRow * 8 + 5] - rookScores[move.endRow * 8 + 7]
+            else: # Lado de la reina
+                position += rookScores[move.endRow * 8 + 3] - rookScores[move.endRow * 8]
+        self.materialScore += sign * material
+        self.positionScore += sign * position
+
+    """
+    Calcula la puntuacion de material y de posicion desde cero recorriendo todo el tablero
+    """
+    def computeScores(self):
+        material = 0
+        position = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    material += MATERIAL_SCORES[piece]
+                    position += POSITION_SCORES[piece][r * 8 + c]
+        return material, position
+
+    """
+    Cuenta las piezas recorriendo todo el tablero
+    """
+    def countPieces(self):
+        return sum(1 for row in self.board for square in row if square != "--")
+
     """
     Actualizar los derechos de poder enrocar
     """
@@ -156,41 +420,172 @@ class GameState():
                     self.currentCastlingRight.bks = False
 
     """
-    Todos los movimientos considerando jaque
+    Todos los movimientos considerando jaque. Si la posicion esta en la cache no se vuelven a generar (se devuelve una
+    lista nueva, asi se puede cambiar sin tocar la cache)
     """
     def getValidMoves(self):
-        tempEnpassantPossible = self.enpassantPossible
-        tempCastleRights = CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                        self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)
-        # Generamos todos los movimientos posibles, para cada movimiento hacemos el movimiento, luego generamos todos
-        # los movimientos del oponente y para cada uno de esos movimientos, miraremos si atacan al rey, si lo hacen
-        # no será un movimiento valido
-        moves = self.getAllPossibleMoves()
+        if self.moveCache is not None:
+            entry = self.moveCache.get(self.zobristKey)
+            if entry is not None:
+                moves, self.checkmate, self.stalemate, self.inCheck = entry
+                return moves
+        moves = self.generateValidMoves()
+        if self.moveCache is not None:
+            self.moveCache.put(self.zobristKey, moves, self.checkmate, self.stalemate, self.inCheck)
+        return moves
+
+    """
+    Genera los movimientos validos sin mirar la cache
+    """
+    def generateValidMoves(self):
         if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
+            kingRow, kingCol = self.whiteKingLocation
         else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
-
-        for i in range(len(moves)-1, -1, -1): # Recorrer la lista del reves para que al borrar no de problemas
-            self.makeMove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            if self.playerInCheck():
-                moves.remove(moves[i]) # Quitamos el movimiento no valido
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
-        if len(moves) == 0: # Esto significa que es jaque o estancamiento (rey ahogado)
-            if self.playerInCheck():
-                self.checkmate = True
-            else:
-                self.stalemate = True
+            kingRow, kingCol = self.blackKingLocation
+        # En vez de hacer y deshacer cada movimiento, buscamos desde el rey las piezas clavadas y las que dan jaque.
+        # Con eso sabemos que movimientos son legales sin generar los movimientos del oponente
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks(kingRow, kingCol)
+        moves = self.filterLegalMoves(self.getAllPossibleMoves(), kingRow, kingCol)
+
+        if not self.inCheck:
+            self.getCastleMoves(kingRow, kingCol, moves)
+
+        # Sin movimientos es jaque mate o estancamiento (rey ahogado). Se ponen siempre los dos flags, si no se quedaria
+        # puesto el de la ultima posicion sin movimientos (por ejemplo un mate seguido de un ahogado)
+        self.checkmate = len(moves) == 0 and self.inCheck
+        self.stalemate = len(moves) == 0 and not self.inCheck
+
+        return moves
+
+    """
+    Solo las capturas (y promociones) legales, sin generar los movimientos tranquilos. Para la busqueda de quiescencia.
+    No cambia checkmate ni stalemate, ya que no tener capturas no significa que no haya movimientos
+    """
+    def getCaptureMoves(self):
+        if self.whiteToMove:
+            kingRow, kingCol = self.whiteKingLocation
         else:
-            self.checkmate = False
-            self.stalemate = False
+            kingRow, kingCol = self.blackKingLocation
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks(kingRow, kingCol)
+        return self.filterLegalMoves(self.getAllPossibleCaptures(), kingRow, kingCol)
 
-        self.enpassantPossible = tempEnpassantPossible
-        self.currentCastlingRight = tempCastleRights
+    """
+    Quita de la lista de movimientos (sin considerar jaques) los que dejan al rey en jaque, usando las piezas clavadas y
+    los jaques que ha encontrado checkForPinsAndChecks
+    """
+    def filterLegalMoves(self, pseudoMoves, kingRow, kingCol):
+        moves = []
+        pinDirections = {}
+        for pin in self.pins:
+            pinDirections[(pin[0], pin[1])] = (pin[2], pin[3])
+        doubleCheck = len(self.checks) > 1
+        validSquares = None # Casillas a las que hay que ir para tapar o capturar el jaque (None si no hay jaque)
+        if len(self.checks) == 1:
+            checkRow, checkCol, dirRow, dirCol = self.checks[0]
+            if self.board[checkRow][checkCol][1] == 'N': # Al caballo solo se le puede capturar
+                validSquares = {(checkRow, checkCol)}
+            else:
+                validSquares = set()
+                for i in range(1, 8):
+                    square = (kingRow + dirRow * i, kingCol + dirCol * i)
+                    validSquares.add(square)
+                    if square == (checkRow, checkCol): # Llegamos a la pieza que da jaque
+                        break
+
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        king = self.board[kingRow][kingCol]
+        self.board[kingRow][kingCol] = '--' # Quitamos el rey para que no tape los ataques a las casillas a las que va
+        for move in pseudoMoves:
+            if move.pieceMoved[1] == 'K':
+                # El rey no puede ir a una casilla atacada
+                if self.isAttacked((move.endRow, move.endCol), enemyColor):
+                    continue
+            elif move.isEnpassantMove:
+                # El en passant quita dos peones de la misma fila, lo comprobamos poniendo los peones en su sitio final
+                self.board[move.startRow][move.startCol] = '--'
+                self.board[move.startRow][move.endCol] = '--'
+                self.board[move.endRow][move.endCol] = move.pieceMoved
+                kingAttacked = self.isAttacked((kingRow, kingCol), enemyColor)
+                self.board[move.startRow][move.startCol] = move.pieceMoved
+                self.board[move.startRow][move.endCol] = move.pieceCaptured
+                self.board[move.endRow][move.endCol] = '--'
+                if kingAttacked:
+                    continue
+            else:
+                if doubleCheck: # Con jaque doble solo se puede mover el rey
+                    continue
+                pinDirection = pinDirections.get((move.startRow, move.startCol))
+                # Una pieza clavada solo se puede mover en la direccion de la clavada
+                if pinDirection is not None and \
+                        (move.endRow - kingRow) * pinDirection[1] != (move.endCol - kingCol) * pinDirection[0]:
+                    continue
+                if validSquares is not None and (move.endRow, move.endCol) not in validSquares:
+                    continue
+            moves.append(move)
+        self.board[kingRow][kingCol] = king
         return moves
 
+    """
+    Mirar desde la casilla r, c hacia fuera (lineas, diagonales y saltos de caballo) para encontrar las piezas del
+    jugador que estan clavadas y las piezas enemigas que dan jaque
+    """
+    def checkForPinsAndChecks(self, r, c):
+        pins = [] # Casillas de las piezas aliadas clavadas y la direccion de la clavada
+        checks = [] # Casillas de las piezas enemigas que dan jaque y la direccion del jaque
+        inCheck = False
+        if self.whiteToMove:
+            enemyColor = 'b'
+            allyColor = 'w'
+        else:
+            enemyColor = 'w'
+            allyColor = 'b'
+        # Las 4 primeras direcciones son de torre y las 4 ultimas de alfil
+        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+        for j in range(len(directions)):
+            d = directions[j]
+            possiblePin = () # Se resetea para cada direccion
+            for i in range(1, 8):
+                endRow = r + d[0] * i
+                endCol = c + d[1] * i
+                if 0 <= endRow < 8 and 0 <= endCol < 8:
+                    endPiece = self.board[endRow][endCol]
+                    if endPiece[0] == allyColor and endPiece[1] != 'K':
+                        if possiblePin == (): # Primera pieza aliada, puede estar clavada
+                            possiblePin = (endRow, endCol, d[0], d[1])
+                        else: # Segunda pieza aliada, no hay clavada ni jaque en esta direccion
+                            break
+                    elif endPiece[0] == enemyColor:
+                        pieceType = endPiece[1]
+                        # La pieza enemiga ataca en esta direccion si:
+                        # 1) es una torre en linea recta
+                        # 2) es un alfil en diagonal
+                        # 3) es un peon a una casilla en la diagonal hacia la que avanza
+                        # 4) es una reina en cualquier direccion
+                        # 5) es el rey a una casilla en cualquier direccion
+                        if (0 <= j <= 3 and pieceType == 'R') or (4 <= j <= 7 and pieceType == 'B') or \
+                                (i == 1 and pieceType == 'p' and ((enemyColor == 'w' and 6 <= j <= 7) or
+                                                                  (enemyColor == 'b' and 4 <= j <= 5))) or \
+                                (pieceType == 'Q') or (i == 1 and pieceType == 'K'):
+                            if possiblePin == (): # No hay pieza que bloquee, es jaque
+                                inCheck = True
+                                checks.append((endRow, endCol, d[0], d[1]))
+                            else: # Hay una pieza aliada en medio, esta clavada
+                                pins.append(possiblePin)
+                        break # La pieza enemiga bloquea el resto de la direccion
+                else: # Fuera del tablero
+                    break
+        # Jaques de caballo
+        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        for m in knightMoves:
+            endRow = r + m[0]
+            endCol = c + m[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                endPiece = self.board[endRow][endCol]
+                if endPiece[0] == enemyColor and endPiece[1] == 'N':
+                    inCheck = True
+                    checks.append((endRow, endCol, m[0], m[1]))
+        return inCheck, pins, checks
+
     """
     Determina si el jugador está en jaque
     """
@@ -204,13 +599,69 @@ class GameState():
     Determinar si el enemigo puede atacar a la casilla r, c (row, column)
     """
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove # Cambiamos al turno del oponente
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove  # Volvemos a cambiar el turno
-        for move in oppMoves:
-            # Si se cumple la casilla está siendo atacada
-            if move.endRow == r and move.endCol == c:
-                return True
+        return self.isAttacked((r, c), 'b' if self.whiteToMove else 'w')
+
+    """
+    Determinar si alguna pieza del color byColor ('w' o 'b') ataca la casilla square (row, column). Se mira hacia fuera
+    desde la casilla (saltos de caballo, diagonales de peon, casillas del rey y lineas rectas y diagonales) y se devuelve
+    en cuanto se encuentra un atacante, sin generar movimientos
+    """
+    def isAttacked(self, square, byColor):
+        r, c = square
+        board = self.board
+        # Peones: las blancas atacan hacia arriba, asi que el peon atacante esta una fila por debajo
+        pawnRow = r + 1 if byColor == 'w' else r - 1
+        if 0 <= pawnRow < 8:
+            if c - 1 >= 0:
+                piece = board[pawnRow][c - 1]
+                if piece[0] == byColor and piece[1] == 'p':
+                    return True
+            if c + 1 <= 7:
+                piece = board[pawnRow][c + 1]
+                if piece[0] == byColor and piece[1] == 'p':
+                    return True
+        # Caballos
+        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        for m in knightMoves:
+            endRow = r + m[0]
+            endCol = c + m[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                piece = board[endRow][endCol]
+                if piece[0] == byColor and piece[1] == 'N':
+                    return True
+        # Rey enemigo en una casilla de al lado
+        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+        for m in kingMoves:
+            endRow = r + m[0]
+            endCol = c + m[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                piece = board[endRow][endCol]
+                if piece[0] == byColor and piece[1] == 'K':
+                    return True
+        # Torres y reinas en lineas rectas
+        for d in ((-1, 0), (0, -1), (1, 0), (0, 1)):
+            endRow = r + d[0]
+            endCol = c + d[1]
+            while 0 <= endRow < 8 and 0 <= endCol < 8:
+                piece = board[endRow][endCol]
+                if piece != "--":
+                    if piece[0] == byColor and (piece[1] == 'R' or piece[1] == 'Q'):
+                        return True
+                    break # Cualquier otra pieza bloquea la linea
+                endRow += d[0]
+                endCol += d[1]
+        # Alfiles y reinas en diagonal
+        for d in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+            endRow = r + d[0]
+            endCol = c + d[1]
+            while 0 <= endRow < 8 and 0 <= endCol < 8:
+                piece = board[endRow][endCol]
+                if piece != "--":
+                    if piece[0] == byColor and (piece[1] == 'B' or piece[1] == 'Q'):
+                        return True
+                    break
+                endRow += d[0]
+                endCol += d[1]
         return False
 
     """
@@ -227,6 +678,56 @@ class GameState():
                     self.moveFunctions[piece](r, c, moves)
         return moves
 
+    """
+    Todas las capturas y promociones sin considerar jaques (sin generar los movimientos tranquilos)
+    """
+    def getAllPossibleCaptures(self):
+        moves = []
+        board = self.board
+        if self.whiteToMove:
+            allyColor, enemyColor, forward, lastRow = 'w', 'b', -1, 0
+        else:
+            allyColor, enemyColor, forward, lastRow = 'b', 'w', 1, 7
+        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+        directions = {'R': ((-1, 0), (0, -1), (1, 0), (0, 1)), 'B': ((-1, -1), (-1, 1), (1, -1), (1, 1)),
+                      'Q': ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))}
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != allyColor:
+                    continue
+                pieceType = piece[1]
+                if pieceType == 'p':
+                    endRow = r + forward
+                    if endRow == lastRow and board[endRow][c] == "--": # Promocion sin captura
+                        moves.append(Move((r, c), (endRow, c), board))
+                    for endCol in (c - 1, c + 1):
+                        if 0 <= endCol < 8:
+                            if board[endRow][endCol][0] == enemyColor:
+                                moves.append(Move((r, c), (endRow, endCol), board))
+                            elif (endRow, endCol) == self.enpassantPossible:
+                                moves.append(Move((r, c), (endRow, endCol), board, isEnpassantMove = True))
+                elif pieceType == 'N' or pieceType == 'K':
+                    for m in (knightMoves if pieceType == 'N' else kingMoves):
+                        endRow = r + m[0]
+                        endCol = c + m[1]
+                        if 0 <= endRow < 8 and 0 <= endCol < 8 and board[endRow][endCol][0] == enemyColor:
+                            moves.append(Move((r, c), (endRow, endCol), board))
+                else:
+                    for d in directions[pieceType]:
+                        endRow = r + d[0]
+                        endCol = c + d[1]
+                        while 0 <= endRow < 8 and 0 <= endCol < 8:
+                            endPiece = board[endRow][endCol]
+                            if endPiece != "--": # Solo la primera pieza del camino, si es enemiga
+                                if endPiece[0] == enemyColor:
+                                    moves.append(Move((r, c), (endRow, endCol), board))
+                                break
+                            endRow += d[0]
+                            endCol += d[1]
+        return moves
+
     """
     Obtener todos los movimientos del peon en la fila y columna y añadir los movimientos a la lista "moves"
     """
@@ -376,13 +877,25 @@ class GameState():
 
 class CastleRights():
     #wks: white king side, bks: black king side, wqs: white queen side, bks: black queen side,
+    __slots__ = ('wks', 'bks', 'wqs', 'bqs')
+
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
         self.bks = bks
         self.wqs = wqs
         self.bqs = bqs
 
+    """
+    Numero del 0 al 15 con un bit por cada derecho de enroque (para el hash Zobrist)
+    """
+    def index(self):
+        return self.wks | self.bks << 1 | self.wqs << 2 | self.bqs << 3
+
 class Move():
+    # Se crean cientos de miles de movimientos en cada busqueda, con __slots__ no tienen __dict__ y ocupan mucho menos
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'isPawnPromotion',
+                 'isCastleMove', 'isEnpassantMove', 'isCapture', 'moveID')
+
     # Mapea claves a valores Clave : Valor
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4,
                    "5": 3, "6": 2, "7": 1, "8": 0}
@@ -391,25 +904,31 @@ class Move():
                    "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
+    # Bits de encode() para los movimientos especiales
+    CASTLE_FLAG = 1 << 12
+    ENPASSANT_FLAG = 1 << 13
+    PROMOTION_FLAG = 1 << 14
+
     def __init__(self, startSq, endSq, board, isEnpassantMove = False, isCastleMove = False):
         # Inicializa los atributos del movimiento
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol] # Pieza movida
-        self.pieceCaptured = board[self.endRow][self.endCol] # Pieza capturada
+        self.startRow = startRow = startSq[0]
+        self.startCol = startCol = startSq[1]
+        self.endRow = endRow = endSq[0]
+        self.endCol = endCol = endSq[1]
+        self.pieceMoved = pieceMoved = board[startRow][startCol] # Pieza movida
+        self.pieceCaptured = board[endRow][endCol] # Pieza capturada
         # Para la promocion del peon (en su metodo hay que repetir esto muchas veces)
-        self.isPawnPromotion = (self.pieceMoved == 'wp' and self.endRow == 0) or (self.pieceMoved == 'bp' and self.endRow == 7)
+        self.isPawnPromotion = (pieceMoved == 'wp' and endRow == 0) or (pieceMoved == 'bp' and endRow == 7)
         # Enrocar
         self.isCastleMove = isCastleMove
         # Para el en passant
         self.isEnpassantMove = isEnpassantMove
-        if self.isEnpassantMove:
-            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
+        if isEnpassantMove:
+            self.pieceCaptured = 'wp' if pieceMoved == 'bp' else 'bp'
 
         self.isCapture = self.pieceCaptured != '--'
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        # Casilla de origen (6 bits) y de destino (6 bits) empaquetadas en un entero
+        self.moveID = startRow * 8 + startCol | (endRow * 8 + endCol) << 6
 
     """
     Override metodo equals
@@ -419,6 +938,22 @@ class Move():
             return  self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
+    """
+    El movimiento como entero de 16 bits: moveID (origen y destino) mas un bit para enroque, en passant y promocion
+    """
+    def encode(self):
+        code = self.moveID
+        if self.isCastleMove:
+            code |= Move.CASTLE_FLAG
+        if self.isEnpassantMove:
+            code |= Move.ENPASSANT_FLAG
+        if self.isPawnPromotion:
+            code |= Move.PROMOTION_FLAG
+        return code
+
     def getChessNotation(self):
         # Devuelve la notación de ajedrez del movimiento (por ejemplo, "e2e4" para un movimiento de peón)
         return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
@@ -2,10 +2,15 @@
 Este es nuestro archivo principal. Será responsable de manejar la entrada del usuario y mostrar el objeto gameState actual.
 """
 
+import time
+startupStart = time.perf_counter() # Para medir lo que tarda en arrancar (--startup-times)
+
+import queue
+import threading
 import pygame as p # Importa la biblioteca pygame
-from Chess import ChessEngine, SmartMoveFinder # Importa el módulo ChessEngine desde el paquete Chess
+from Chess import ChessEngine, SmartMoveFinder, SpriteAtlas # Importa el módulo ChessEngine desde el paquete Chess
 
-import easygui
+importSeconds = time.perf_counter() - startupStart
 
 BOARD_WIDTH = BOARD_HEIGHT = 512 # Define el ancho y alto de la ventana del juego
 MOVE_LOG_PANEL_WIDTH = 450
@@ -13,36 +18,81 @@ MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
 DIMENSION = 8 # Define las dimensiones del tablero de ajedrez (8x8)
 SQ_SIZE = BOARD_HEIGHT // DIMENSION # Calcula el tamaño de cada cuadrado del tablero
 MAX_FPS = 15 # Establece el máximo de fps para animaciones más adelante
+ANIMATION_MS = 200 # Lo que dura la animacion de un movimiento, sea de una casilla o de todo el tablero
+ANIMATION_FPS = 60
+USE_BITBOARDS = False # Usar la variante de GameState con bitboards para generar los movimientos
+PONDER = True # La IA sigue pensando durante el turno del jugador (sobre el movimiento que espera que haga)
+# BOARD_COLORS = ("white", "gray") Colores del tablero (blanco y gris) para posible cambio color tablero
+BOARD_COLORS = ("#dfc07f", "#7a4f37") # Colores del tablero (clarito y marron)
+MOVE_LOG_RECT = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
+AI_MOVE_EVENT = p.USEREVENT + 1 # Evento que manda el hilo de la IA al terminar para despertar al bucle principal
 IMAGES = {} # Diccionario global para almacenar las imágenes de las piezas del ajedrez
+LAYERS = {} # Superficies que se dibujan una sola vez (el tablero vacio y los resaltados de las casillas)
 
 '''
 El main de nuestro código. Se encargará de la entrada del usuario y de actualizar los gráficos.
 '''
-def main():
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.ChessMain", description="Ajedrez contra la IA o entre dos")
+    parser.add_argument("--startup-times", action="store_true", help="mostrar lo que tarda cada parte del arranque")
+    args = parser.parse_args(argv)
+
+    startupTimes = [("imports", importSeconds)]
+    stepStart = time.perf_counter()
     p.init() # Inicializa Pygame
     screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH, BOARD_HEIGHT)) # Crea la ventana del juego
     clock = p.time.Clock() # Objeto para controlar el tiempo del juego
+    startupTimes.append(("pygame y ventana", time.perf_counter() - stepStart))
+    stepStart = time.perf_counter()
     screen.fill(p.Color("white"))
     moveLogFont = p.font.SysFont("Arial", 16, False, False)  # Nombre fuente, tamaño, negrita, italica
-    gs = ChessEngine.GameState() # Crea un objeto GameState para representar el estado del juego
+    gs = ChessEngine.GameState(bitboards = USE_BITBOARDS) # Crea un objeto GameState para representar el estado del juego
     validMoves = gs.getValidMoves() # Generamos los movimientos validos y los guardamos en una lista
     moveMade = False # Variable flag para cuando un movimiento es hecho
     animate = False # Flag para cuando haya que animar un movimiento
+    startupTimes.append(("partida", time.perf_counter() - stepStart))
+    stepStart = time.perf_counter()
     loadPiecesImages() # Carga las imágenes de las piezas
+    loadLayers() # Dibuja el tablero vacio y los resaltados una sola vez
+    startupTimes.append(("imagenes", time.perf_counter() - stepStart))
+    stepStart = time.perf_counter()
+    view = BoardView(screen, moveLogFont) # Solo vuelve a dibujar lo que cambia de un frame a otro
     running = True
     sqSelected = () # Vble para saber el cuadrado seleccionado, inicialmente no hay ninguna (tuple)
     playerClicks = [] # Constancia de los clicks del jugador para mover las piezas (2 tuples)
     gameOver = False
+    aiSearch = None # Busqueda de la IA en marcha (hilo, evento para cancelarla y cola con el resultado)
+    ponderSearch = None # Busqueda durante el turno del jugador sobre la posicion tras el movimiento esperado
+    ponderMoveID = None # moveID del movimiento que se espera del jugador
+    ponderPending = False # La IA acaba de mover, hay que empezar a pensar en el turno del jugador
+    view.draw(gs, validMoves, sqSelected) # El tablero se ve antes de que salgan los dialogos para elegir jugadores
+    startupTimes.append(("primer frame", time.perf_counter() - stepStart))
+    if args.startup_times:
+        for name, seconds in startupTimes:
+            print("%-18s %7.1f ms" % (name, seconds * 1000))
+        print("%-18s %7.1f ms" % ("total", (time.perf_counter() - startupStart) * 1000))
     selectPlayer()
 
     while running:
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
-        for e in p.event.get():
+        # Si no hay nada que hacer se espera (sin gastar CPU) al siguiente evento. Cuando la IA termina su hilo manda
+        # AI_MOVE_EVENT, asi que tampoco hace falta ir mirando si ya tiene el movimiento
+        if not gameOver and not humanTurn and aiSearch is None:
+            events = p.event.get()
+        else:
+            events = [p.event.wait()] + p.event.get()
+        for e in events:
             # Si el usuario cierra la ventana, detiene el bucle principal
             if e.type == p.QUIT:
                 running = False
+                cancelAISearch(aiSearch) # Cortar la busqueda de la IA en vez de esperar a que termine
+                cancelAISearch(ponderSearch)
+                aiSearch = None
+                ponderSearch = None
             # Al pulsar el raton
-            elif e.type == p.MOUSEBUTTONDOWN:
+            elif e.type == p.MOUSEBUTTONDOWN and e.button not in (4, 5): # 4 y 5 son la rueda del raton
                 if not gameOver and humanTurn:
                     location = p.mouse.get_pos() # Localizacion en ejes x e y del raton
                     col = location[0]//SQ_SIZE
@@ -60,6 +110,14 @@ def main():
                         for i in range(len(validMoves)):
                             if move == validMoves[i]:
                                 gs.makeMove(validMoves[i])
+                                if ponderSearch is not None:
+                                    if validMoves[i].moveID == ponderMoveID:
+                                        # La IA ya estaba pensando esta posicion, su busqueda sigue ahora con tiempo
+                                        SmartMoveFinder.ponderHit(SmartMoveFinder.TIME_LIMIT_MS)
+                                        aiSearch = ponderSearch
+                                    else:
+                                        cancelAISearch(ponderSearch)
+                                    ponderSearch = None
                                 moveMade = True
                                 animate = True
                                 # Reseteamos los clicks del jugador y lo seleccionado
@@ -78,7 +136,11 @@ def main():
                         animate = False
                         gameOver = False
                 if e.key == p.K_r: # Resetear el tablero cuando se pulsa la letra "r"
-                    gs = ChessEngine.GameState()
+                    cancelAISearch(aiSearch)
+                    cancelAISearch(ponderSearch)
+                    aiSearch = None
+                    ponderSearch = None
+                    gs = ChessEngine.GameState(bitboards = USE_BITBOARDS)
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
@@ -86,47 +148,125 @@ def main():
                     animate = False
                     gameOver = False
                     selectPlayer()
+            # La rueda del raton encima del log lo mueve arriba y abajo
+            elif e.type == p.MOUSEWHEEL:
+                if MOVE_LOG_RECT.collidepoint(p.mouse.get_pos()):
+                    view.moveLog.scroll(e.y)
+            # La ventana ha estado tapada (por ejemplo por los dialogos de selectPlayer), hay que dibujarla entera
+            elif e.type in (p.VIDEOEXPOSE, p.WINDOWEXPOSED):
+                view.invalidate()
 
-        # Movimientos IA
-        if not gameOver and not humanTurn:
-            AIMove = SmartMoveFinder.findBestMove(gs, validMoves)
-            if AIMove is None:
-                AIMove = SmartMoveFinder.findRandomMove(validMoves)
-            gs.makeMove(AIMove)
-            moveMade = True
-            animate = True
+        # Movimientos IA: se busca en otro hilo y aqui solo se mira si ya ha terminado, asi la ventana sigue respondiendo
+        if running and not gameOver and not humanTurn:
+            if aiSearch is None:
+                aiSearch = startAISearch(gs)
+            else:
+                AIMove = getAISearchResult(aiSearch, validMoves)
+                if AIMove is not None:
+                    aiSearch = None
+                    gs.makeMove(AIMove)
+                    moveMade = True
+                    animate = True
+                    ponderPending = PONDER
 
         if moveMade:
-            if animate:
-                animateMove(gs.moveLog[-1], screen, gs.board, clock)
             validMoves = gs.getValidMoves()
+            # La busqueda de la IA (o el pondering) empieza antes de animar el movimiento, asi la animacion no la retrasa
+            humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+            if not humanTurn and aiSearch is None and validMoves:
+                aiSearch = startAISearch(gs)
+            # Pondering: tras mover la IA se empieza a buscar la posicion despues del movimiento que se espera del jugador
+            if ponderPending:
+                ponderPending = False
+                ponderMove = SmartMoveFinder.getPonderMove(gs, validMoves)
+                if ponderMove is not None:
+                    ponderMoveID = ponderMove.moveID
+                    ponderSearch = startAISearch(gs, ponderMove)
+            if animate:
+                # La posicion final se dibuja sin mandarla a la pantalla (la pieza se veria un momento en su destino) y
+                # la animacion la manda junto con su primer frame
+                pendingRects = view.draw(gs, validMoves, sqSelected, present=False)
+                animateMove(gs.moveLog[-1], screen, gs.board, clock, pendingRects)
             moveMade = False
             animate = False
 
-        drawGameState(screen, gs, validMoves, sqSelected, moveLogFont) # Dibuja el estado actual del juego en la pantalla
-
+        endText = None
         if gs.checkmate or gs.stalemate:
             gameOver = True
-            drawEndGameText(screen, 'Ahogamiento (R para reiniciar)' if gs.stalemate else
+            endText = ('Ahogamiento (R para reiniciar)' if gs.stalemate else
             'Negras ganan por mate (R para reiniciar)' if gs.whiteToMove else 'Blancas ganan por mate (R para reiniciar)')
 
+        view.draw(gs, validMoves, sqSelected, endText) # Dibuja y actualiza en la pantalla solo lo que ha cambiado
         clock.tick(MAX_FPS) # Controla la velocidad de actualización de la pantalla
-        p.display.flip() # Actualiza la pantalla
+
+'''
+Lanza la busqueda de la IA en un hilo aparte sobre una copia de la posicion (cargada en FEN), asi el tablero de la partida
+no se toca mientras se busca. Con ponderMove se hace ese movimiento en la copia y se busca sin limite de tiempo hasta que
+llegue SmartMoveFinder.ponderHit o se cancele. Devuelve (hilo, evento para cancelar, cola donde se deja el moveID del
+mejor movimiento)
+'''
+def startAISearch(gs, ponderMove=None):
+    searchGs = ChessEngine.GameState(bitboards = USE_BITBOARDS, fen = gs.getFEN())
+    timeLimit = SmartMoveFinder.TIME_LIMIT_MS
+    if ponderMove is not None:
+        for move in searchGs.getValidMoves():
+            if move.moveID == ponderMove.moveID:
+                searchGs.makeMove(move)
+        timeLimit = None
+    stopEvent = threading.Event()
+    resultQueue = queue.Queue()
+    thread = threading.Thread(target=aiSearchWorker, args=(searchGs, timeLimit, stopEvent, resultQueue), daemon=True)
+    thread.start()
+    return thread, stopEvent, resultQueue
+
+'''
+Lo que hace el hilo de la IA. Si se ha cancelado no deja resultado
+'''
+def aiSearchWorker(gs, timeLimit, stopEvent, resultQueue):
+    validMoves = gs.getValidMoves()
+    AIMove = SmartMoveFinder.findBestMove(gs, validMoves, SmartMoveFinder.MAX_DEPTH, timeLimit, stopEvent=stopEvent)
+    if not stopEvent.is_set():
+        resultQueue.put(AIMove.moveID if AIMove is not None else None)
+        p.event.post(p.event.Event(AI_MOVE_EVENT))
+
+'''
+Devuelve el movimiento de la IA (de la lista validMoves de la partida) si la busqueda ya ha terminado o None si sigue
+buscando
+'''
+def getAISearchResult(aiSearch, validMoves):
+    thread, stopEvent, resultQueue = aiSearch
+    try:
+        moveID = resultQueue.get_nowait()
+    except queue.Empty:
+        return None
+    for move in validMoves:
+        if move.moveID == moveID:
+            return move
+    return SmartMoveFinder.findRandomMove(validMoves)
+
+'''
+Cancela la busqueda de la IA en marcha. Se espera al hilo (se corta en pocos nodos) para que no siga usando la tabla de
+transposiciones de SmartMoveFinder cuando empiece la siguiente busqueda
+'''
+def cancelAISearch(aiSearch):
+    if aiSearch is not None:
+        thread, stopEvent, resultQueue = aiSearch
+        stopEvent.set()
+        thread.join()
 
 '''
 Inicializa un diccionario global de imágenes. Esto se llamará exactamente una vez en el main.
 '''
 def loadPiecesImages():
-    pieces = ['wp', 'wR', 'wN', 'wB', 'wK', 'wQ', 'bp', 'bR', 'bN', 'bB', 'bK', 'bQ']
-    for piece in pieces:
-        # Carga las imágenes de las piezas y las escala al tamaño del cuadrado del tablero
-        IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
+    # Las imágenes ya escaladas al tamaño del cuadrado del tablero, del atlas de SpriteAtlas si esta construido
+    IMAGES.update(SpriteAtlas.loadPieces(SQ_SIZE))
 
 '''
 Responsable de los valores de decidir como se jugará
 '''
 def selectPlayer():
     global playerOne, playerTwo, undoMoveEnabled
+    import easygui # Se importa aqui para no retrasar el arranque (tkinter) hasta que se necesitan los dialogos
 
     # Mensaje y título principal
     msg = "¿Quieres jugar contra la máquina o con alguien?"
@@ -156,112 +296,236 @@ def selectPlayer():
         undoMoveEnabled = True
 
 '''
-Responsable de todos los gráficos dentro del estado actual del juego.
+Dibuja una sola vez el tablero vacio y las casillas resaltadas (seleccionada y destinos). Se llama en el main despues de
+crear la ventana
 '''
-def drawGameState(screen, gs, validMoves, sqSelected, moveLogFont):
-    drawBoard(screen) # Esto dibuja los cuadrados en el tablero
-    highlightSquares(screen, gs, validMoves, sqSelected)
-    drawPieces(screen, gs.board) # Esto dibuja las piezas encima de los cuadrados del tablero
-    drawMoveLog(screen, gs, moveLogFont)
+def loadLayers():
+    board = p.Surface((BOARD_WIDTH, BOARD_HEIGHT)).convert()
+    # El primer for recorre filas, el segundo recorre columnas. Dibuja cada casilla del tablero
+    for r in range(DIMENSION):
+        for c in range(DIMENSION):
+            color = p.Color(BOARD_COLORS[(r+c) % 2]) # Alterna los colores de los cuadrados para simular un tablero de ajedrez
+            p.draw.rect(board, color, p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    LAYERS['board'] = board
+    LAYERS['animation'] = p.Surface((BOARD_WIDTH, BOARD_HEIGHT)).convert() # Tablero sin la pieza que se esta moviendo
+    for name, color in (('selected', 'blue'), ('target', 'yellow')):
+        s = p.Surface((SQ_SIZE, SQ_SIZE)).convert()
+        s.set_alpha(100) # Valor de transparencia (0 transparente, 255 opaco)
+        s.fill(p.Color(color))
+        LAYERS[name] = s
 
 '''
-Dibujar los cuadrados en el tablero. OJO: El cuadrado de arriba a la izquierda del tablero siempre es blanco
+Lo que se dibuja de la partida. Se guarda lo que hay en la pantalla (piezas, resaltados, log y texto del final) y en cada
+frame solo se vuelven a dibujar las casillas que han cambiado, que son las unicas que se mandan con display.update
 '''
-def drawBoard(screen):
-    global colors
-    # colors = [p.Color("white"), p.Color("gray")] Colores del tablero (blanco y gris) para posible cambio color tablero
-    colors = [p.Color("#dfc07f"), p.Color("#7a4f37")] # Colores del tablero (marron y clarito)
+class BoardView():
+    def __init__(self, screen, moveLogFont):
+        self.screen = screen
+        self.moveLog = MoveLogView(moveLogFont)
+        self.invalidate()
 
-    # El primer for recorre filas, el segundo recorre columnas. Dibuja cada casilla del tablero
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            color = colors[((r+c) % 2)] # Alterna los colores de los cuadrados para simular un tablero de ajedrez
-            p.draw.rect(screen, color, p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    """
+    Lo que hay en la pantalla ya no vale (ventana tapada, animacion...), el siguiente draw lo dibuja todo
+    """
+    def invalidate(self):
+        self.drawnBoard = None
+        self.drawnHighlights = {}
+        self.drawnEndText = None
+
+    """
+    Dibuja lo que ha cambiado desde el ultimo draw. Devuelve los rectangulos actualizados. Con present=False solo se dibuja
+    en la superficie de la ventana y no se manda nada a la pantalla, eso queda para quien recibe los rectangulos
+    """
+    def draw(self, gs, validMoves, sqSelected, endText=None, present=True):
+        board = gs.board
+        highlights = getHighlights(gs, validMoves, sqSelected)
+        drawnBoard = self.drawnBoard
+        fullRedraw = drawnBoard is None or endText != self.drawnEndText
+        if fullRedraw:
+            squares = [(r, c) for r in range(DIMENSION) for c in range(DIMENSION)]
+        else:
+            squares = [(r, c) for r in range(DIMENSION) for c in range(DIMENSION)
+                       if board[r][c] != drawnBoard[r][c] or highlights.get((r, c)) != self.drawnHighlights.get((r, c))]
+            if squares and endText is not None: # El texto del final esta encima de las casillas
+                fullRedraw = True
+                squares = [(r, c) for r in range(DIMENSION) for c in range(DIMENSION)]
+        dirtyRects = []
+        for r, c in squares:
+            dirtyRects.append(drawSquare(self.screen, r, c, board[r][c], highlights.get((r, c))))
+        if self.moveLog.update(gs.moveLog) or fullRedraw:
+            self.moveLog.draw(self.screen)
+            dirtyRects.append(MOVE_LOG_RECT)
+        if endText is not None and fullRedraw:
+            drawEndGameText(self.screen, endText)
 
+        if fullRedraw:
+            dirtyRects = [self.screen.get_rect()]
+        if present and dirtyRects:
+            p.display.update(dirtyRects)
+        self.drawnBoard = [row[:] for row in board]
+        self.drawnHighlights = highlights
+        self.drawnEndText = endText
+        return dirtyRects
+
+'''
+Dibuja una casilla entera: su color del tablero, el resaltado (None, 'selected' o 'target') y la pieza. Devuelve su rectangulo
 '''
-Resaltar la casilla seleccionada y los movimientos posibles de la pieza seleccionada
+def drawSquare(screen, r, c, piece, highlight=None):
+    square = p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    screen.blit(LAYERS['board'], square, square)
+    if highlight is not None:
+        screen.blit(LAYERS[highlight], square)
+    if piece != "--":
+        screen.blit(IMAGES[piece], square)
+    return square
+
 '''
-def highlightSquares(screen, gs, validMoves, sqSelected):
+Casillas que hay que resaltar: la seleccionada y los movimientos posibles de la pieza seleccionada. Devuelve un diccionario
+casilla -> 'selected' o 'target'
+'''
+def getHighlights(gs, validMoves, sqSelected):
+    highlights = {}
     if sqSelected != ():
         r, c = sqSelected
         if gs.board[r][c][0] == ('w' if gs.whiteToMove else 'b'): # Casilla seleccionada es una pieza que se puede mover
-            # Resaltar la casilla seleccionada
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100) # Valor de transparencia (0 transparente, 255 opaco)
-            s.fill(p.Color('blue'))
-            screen.blit(s, (c*SQ_SIZE, r*SQ_SIZE))
-            # Resaltar movimientos de esa casilla
-            s.fill(p.Color('yellow'))
             for move in validMoves:
                 if move.startRow == r and move.startCol == c:
-                    screen.blit(s, (move.endCol*SQ_SIZE, move.endRow*SQ_SIZE))
+                    highlights[(move.endRow, move.endCol)] = 'target'
+            highlights[(r, c)] = 'selected'
+    return highlights
 
 '''
-Dibujar las piezas en el tablero usando el GameState.board actual
+Log de los movimientos. Cada linea (MOVES_PER_LINE movimientos completos) se dibuja una sola vez en su propia superficie:
+cuando se hace un movimiento solo se vuelve a dibujar la ultima linea y al deshacer o reiniciar se quitan las que sobran.
+Solo se pintan las lineas que caben en el panel (las ultimas, o las de mas arriba si se ha movido la rueda del raton)
 '''
-def drawPieces(screen, board):
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece = board[r][c] # Obtiene la pieza en la posición (r, c) del tablero
-            if piece != "--": # Nos aseguramos que no sea un cuadrado vacio, para dibujar la pieza
-                screen.blit(IMAGES[piece], p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+class MoveLogView():
+    MOVES_PER_LINE = 5
+    PADDING = 5
+    LINE_SPACING = 2
 
-'''
-Dibujar el log de los movimientos
-'''
-def drawMoveLog(screen, gs, font):
-    moveLogRect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
-    p.draw.rect(screen, p.Color("black"), moveLogRect)
-    moveLog = gs.moveLog
-    moveTexts = []
-    for i in range(0, len(moveLog), 2):
-        moveString = str(i//2 + 1) + ". " + str(moveLog[i]) + " "
-        if i + 1 < len(moveLog): # Para asegurarse que las negras también han movido
-            moveString += str(moveLog[i+1])
-        moveTexts.append(moveString)
-
-    movesPerRow = 5
-    padding = 5
-    lineSpacing = 2
-    textY = padding
-
-    for i in range(0, len(moveTexts), movesPerRow):
+    def __init__(self, font):
+        self.font = font
+        self.moves = [] # Movimientos (los objetos Move de gs.moveLog) que ya estan en las lineas
+        self.texts = [] # Texto de cada movimiento
+        self.lines = [] # Superficie de cada linea
+        self.scrollLines = 0 # Lineas que se ha subido desde el final
+        self.lineHeight = font.get_height() + self.LINE_SPACING
+        self.visibleLines = max(1, (MOVE_LOG_PANEL_HEIGHT - self.PADDING) // self.lineHeight)
+        self.changed = True
+
+    """
+    Se pone al dia con el moveLog de la partida. Devuelve True si ha cambiado algo que hay que volver a dibujar
+    """
+    def update(self, moveLog):
+        moves = self.moves
+        common = min(len(moves), len(moveLog))
+        # Se comparan los objetos Move: al deshacer o reiniciar los que ya no estan (o son otros) se quitan
+        while common and moves[common - 1] is not moveLog[common - 1]:
+            common -= 1
+        if common == len(moves) == len(moveLog):
+            return self.changed
+        del moves[common:]
+        del self.texts[common:]
+        for move in moveLog[common:]:
+            moves.append(move)
+            self.texts.append(str(move))
+        firstLine = common // (2 * self.MOVES_PER_LINE)
+        del self.lines[firstLine:]
+        for line in range(firstLine, (len(moves) + 2 * self.MOVES_PER_LINE - 1) // (2 * self.MOVES_PER_LINE)):
+            self.lines.append(self.renderLine(line))
+        self.scrollLines = 0 # Al cambiar la partida se vuelve a ver el final
+        self.changed = True
+        return True
+
+    """
+    Dibuja el texto de la linea: "1. e4 e5  2. Nf3 Nc6  ..."
+    """
+    def renderLine(self, line):
+        texts = self.texts
         text = ""
-        for j in range(movesPerRow):
-            if i + j < len(moveTexts):
-                text += moveTexts[i+j]+ "  "
-        textObject = font.render(text, True, p.Color('green')) # Color de las letras de log (probar white tambien)
-        textLocation = moveLogRect.move(padding, textY)
-        screen.blit(textObject, textLocation)
-        textY += textObject.get_height() + lineSpacing
+        first = line * 2 * self.MOVES_PER_LINE
+        for i in range(first, min(first + 2 * self.MOVES_PER_LINE, len(texts)), 2):
+            text += str(i//2 + 1) + ". " + texts[i] + " "
+            if i + 1 < len(texts): # Para asegurarse que las negras también han movido
+                text += texts[i+1]
+            text += "  "
+        return self.font.render(text, True, p.Color('green')) # Color de las letras de log (probar white tambien)
+
+    """
+    Mueve el log con la rueda del raton (amount > 0 hacia arriba). Devuelve True si ha cambiado lo que se ve
+    """
+    def scroll(self, amount):
+        maxScroll = max(0, len(self.lines) - self.visibleLines)
+        scrollLines = min(maxScroll, max(0, self.scrollLines + amount))
+        if scrollLines == self.scrollLines:
+            return False
+        self.scrollLines = scrollLines
+        self.changed = True
+        return True
+
+    def draw(self, screen):
+        p.draw.rect(screen, p.Color("black"), MOVE_LOG_RECT)
+        last = len(self.lines) - self.scrollLines
+        textY = self.PADDING
+        for line in self.lines[max(0, last - self.visibleLines):last]:
+            screen.blit(line, (MOVE_LOG_RECT.x + self.PADDING, textY))
+            textY += self.lineHeight
+        self.changed = False
 
 '''
-Animar los movimientos
+Animar los movimientos. En la pantalla ya esta dibujada la posicion final: se copia una vez el tablero sin la pieza que se
+mueve (con la pieza capturada en su casilla) y en cada frame solo se repone de esa copia el rectangulo donde estaba la
+pieza y se dibuja en el nuevo, actualizando la union de los dos. La animacion dura siempre ANIMATION_MS. pendingRects son
+los rectangulos ya dibujados en screen que todavia no se han mandado a la pantalla, van con el primer frame
 '''
-def animateMove(move, screen, board, clock):
-    global colors
-    dR = move.endRow - move.startRow
-    dC = move.endCol - move.startCol
-    framesPerSquare = 10 # Frames para mover una casilla
-    frameCount = (abs(dR) + abs(dC)) * framesPerSquare
-    for frame in range(frameCount + 1):
-        r, c = (move.startRow + dR * frame/frameCount, move.startCol + dC * frame/frameCount)
-        drawBoard(screen)
-        drawPieces(screen, board)
-        # Borrar la pieza movida de su casilla final
-        color = colors[(move.endRow + move.endCol) % 2]
-        endSquare = p.Rect(move.endCol * SQ_SIZE, move.endRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-        p.draw.rect(screen, color, endSquare)
-        # Dibujar la pieza capturada en el rectangulo
-        if move.pieceCaptured != '--':
-            if move.isEnpassantMove:
-                enPassantRow = move.endRow + 1 if move.pieceCaptured[0] == 'b' else move.endRow - 1
-                endSquare = p.Rect(move.endCol * SQ_SIZE, enPassantRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
+def animateMove(move, screen, board, clock, pendingRects=()):
+    static = LAYERS['animation']
+    static.blit(screen, (0, 0), (0, 0, BOARD_WIDTH, BOARD_HEIGHT))
+    endSquare = p.Rect(move.endCol * SQ_SIZE, move.endRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    # Borrar la pieza movida de su casilla final
+    static.blit(LAYERS['board'], endSquare, endSquare)
+    # Dibujar la pieza capturada en el rectangulo
+    capturedSquare = endSquare
+    if move.pieceCaptured != '--':
+        if move.isEnpassantMove:
+            enPassantRow = move.endRow + 1 if move.pieceCaptured[0] == 'b' else move.endRow - 1
+            capturedSquare = p.Rect(move.endCol * SQ_SIZE, enPassantRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        static.blit(IMAGES[move.pieceCaptured], capturedSquare)
+    screen.blit(static, capturedSquare, capturedSquare)
+
+    piece = IMAGES[move.pieceMoved]
+    pieceRect = p.Rect(move.startCol * SQ_SIZE, move.startRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    oldRect = endSquare.copy()
+    dirtyRect = capturedSquare.copy()
+    startX, startY = pieceRect.topleft
+    dX = endSquare.x - startX
+    dY = endSquare.y - startY
+    startTime = p.time.get_ticks()
+    progress = 0
+    while progress < 1:
+        progress = min(1, (p.time.get_ticks() - startTime) / ANIMATION_MS)
+        pieceRect.topleft = (startX + round(dX * progress), startY + round(dY * progress))
+        screen.blit(static, oldRect, oldRect) # Quitar la pieza de donde estaba en el frame anterior
         # Dibujar la pieza moviendose
-        screen.blit(IMAGES[move.pieceMoved], p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        p.display.flip()
-        clock.tick(60)
+        screen.blit(piece, pieceRect)
+        dirtyRect.union_ip(oldRect)
+        dirtyRect.union_ip(pieceRect)
+        if pendingRects:
+            p.display.update([dirtyRect] + list(pendingRects))
+            pendingRects = ()
+        else:
+            p.display.update(dirtyRect)
+        oldRect.update(pieceRect)
+        dirtyRect.update(pieceRect)
+        clock.tick(ANIMATION_FPS)
+
+    # Al terminar se deja la posicion final tal y como estaba (con la pieza promocionada si la hay)
+    screen.blit(static, oldRect, oldRect)
+    drawSquare(screen, move.endRow, move.endCol, board[move.endRow][move.endCol])
+    if capturedSquare is not endSquare:
+        drawSquare(screen, capturedSquare.y // SQ_SIZE, capturedSquare.x // SQ_SIZE, '--') # Peon capturado al paso
+    p.display.update(capturedSquare.union(endSquare))
 
 def drawEndGameText(screen, text):
     font = p.font.SysFont("Arial", 30, True, False) # Nombre fuente, tamaño, negrita, italica
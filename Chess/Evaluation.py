@@ -0,0 +1,88 @@
+"""
+Tablas de puntuacion de las piezas que usa la IA para evaluar el tablero: el valor de cada pieza (material) y lo que vale
+cada pieza en cada casilla (posicion). GameState las usa para llevar la puntuacion al dia en cada movimiento.
+"""
+
+pieceScore = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "p": 1}
+
+# Evaluacion de puntuacion para los caballos (mejor que no se vayan a las columnas 1 o 8) y otras piezas
+knightPositionScores = [[1, 1, 1, 1, 1, 1, 1, 1],
+                        [1, 2, 2, 2, 2, 2, 2, 1],
+                        [1000, 2, 3, 3, 3, 3, 2, 1000],
+                        [-1, 2, 3, 4, 4, 3, 2, -1],
+                        [-1, 2, 3, 4, 4, 3, 2, -1],
+                        [-1, 2, 3, 3, 3, 3, 2, -1],
+                        [1, 2, 2, 2, 2, 2, 2, 1],
+                        [1, 1, 1, 1, 1, 1, 1, 1]]
+
+# Buscamos las diagonales con los alfiles
+bishopPositionScores = [[4, 3, 2, 1, 1, 2, 3, 4],
+                        [3, 4, 3, 2, 2, 3, 4, 3],
+                        [2, 3, 4, 3, 3, 4, 3, 2],
+                        [1, 2, 3, 4, 4, 3, 2, 1],
+                        [1, 2, 3, 4, 4, 3, 2, 1],
+                        [2, 3, 4, 3, 3, 4, 3, 2],
+                        [3, 4, 3, 2, 2, 3, 4, 3],
+                        [4, 3, 2, 1, 1, 2, 3, 4]]
+
+# Cuanto mas por el centro la reina mejor
+queenPositionScores = [[1, 1, 1, 3, 1, 1, 1, 1],
+                       [1, 2, 3, 3, 3, 1, 1, 1],
+                       [1, 4, 3, 3, 3, 4, 2, 1],
+                       [1, 2, 3, 3, 3, 2, 2, 1],
+                       [1, 2, 3, 3, 3, 2, 2, 1],
+                       [1, 4, 3, 3, 3, 4, 2, 1],
+                       [1, 1, 2, 3, 3, 1, 1, 1],
+                       [1, 1, 1, 3, 1, 1, 1, 1]]
+
+rookPositionScores = [[6, 2, 4, 4, 4, 4, 2, 6],
+                      [1, 4, 4, 4, 4, 4, 4, 1],
+                      [1, 1, 2, 3, 3, 2, 1, 1],
+                      [1, 2, 3, 4, 4, 3, 2, 1],
+                      [1, 2, 3, 4, 4, 3, 2, 1],
+                      [1, 1, 2, 3, 3, 2, 1, 1],
+                      [1, 4, 4, 4, 4, 4, 4, 1],
+                      [6, 2, 4, 4, 4, 4, 2, 6]]
+
+whitePawnPositionScores = [[8, 8, 8, 8, 8, 8, 8, 8],
+                           [8, 8, 8, 8, 8, 8, 8, 8],
+                           [5, 6, 6, 7, 7, 6, 6, 5],
+                           [2, 3, 3, 5, 5, 3, 3, 2],
+                           [1, 2, 3, 4, 4, 3, 2, 1],
+                           [1, 1, 2, 3, 3, 2, 1, 1],
+                           [0, 1, 1, 0, 0, 1, 1, 0],
+                           [0, 0, 0, 0, 0, 0, 0, 0]]
+
+blackPawnPositionScores = [[0, 0, 0, 0, 0, 0, 0, 0],
+                           [0, 1, 1, 0, 0, 1, 1, 0],
+                           [1, 1, 2, 3, 3, 2, 1, 1],
+                           [1, 2, 3, 4, 4, 3, 2, 1],
+                           [1, 3, 3, 5, 5, 3, 3, 1],
+                           [5, 6, 6, 7, 7, 6, 6, 5],
+                           [8, 8, 8, 8, 8, 8, 8, 8],
+                           [8, 8, 8, 8, 8, 8, 8, 8]]
+
+
+piecePositionScores = {"N": knightPositionScores, "Q": queenPositionScores, "B": bishopPositionScores, "R": rookPositionScores, "bp": blackPawnPositionScores,
+                       "wp": whitePawnPositionScores}
+
+'''
+Precalcula lo que suma a la puntuacion cada pieza en cada casilla (indice fila * 8 + columna), igual que scoreBoard:
+el material va en positivo para las blancas y en negativo para las negras, y la posicion se suma en los dos casos.
+Se guardan como enteros (la posicion se multiplica por .1 al final) para que la suma incremental sea exacta
+'''
+def buildPieceSquareTables():
+    materialScores = {}
+    positionScores = {}
+    for color in ('w', 'b'):
+        for pieceType in ('p', 'R', 'N', 'B', 'Q', 'K'):
+            piece = color + pieceType
+            materialScores[piece] = pieceScore[pieceType] if color == 'w' else -pieceScore[pieceType]
+            if pieceType == 'K': # Al rey no se le puntua por posicion
+                positionScores[piece] = [0] * 64
+            else:
+                table = piecePositionScores[piece] if pieceType == 'p' else piecePositionScores[pieceType]
+                positionScores[piece] = [table[sq // 8][sq % 8] for sq in range(64)]
+    return materialScores, positionScores
+
+MATERIAL_SCORES, POSITION_SCORES = buildPieceSquareTables()
@@ -0,0 +1,56 @@
+"""
+Cache LRU de los movimientos validos de cada posicion (por su clave Zobrist), con los flags de jaque mate, ahogado y
+jaque. Asi no se vuelven a generar los movimientos de una posicion por la que ya se ha pasado (al deshacer un
+movimiento, cuando la IA y el tablero piden la misma posicion, transposiciones en la busqueda...).
+Los movimientos se guardan en una tupla y se devuelve siempre una lista nueva, asi quien la reciba puede cambiarla
+(random.shuffle, sort...) sin estropear lo guardado.
+"""
+
+from collections import OrderedDict
+
+class MoveCache():
+    def __init__(self, maxEntries=4096):
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict() # Clave Zobrist -> (movimientos, checkmate, stalemate, inCheck)
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.resetStats()
+
+    """
+    Devuelve (lista nueva con los movimientos, checkmate, stalemate, inCheck) o None si la posicion no esta
+    """
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key) # Usada hace poco, es la ultima en salir
+        moves, checkmate, stalemate, inCheck = entry
+        return list(moves), checkmate, stalemate, inCheck
+
+    """
+    Guarda los movimientos de una posicion. Si ya hay maxEntries posiciones se quita la que lleva mas tiempo sin usarse
+    """
+    def put(self, key, moves, checkmate, stalemate, inCheck):
+        entries = self.entries
+        entries[key] = (tuple(moves), checkmate, stalemate, inCheck)
+        entries.move_to_end(key)
+        if len(entries) > self.maxEntries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    """
+    Estadisticas de uso de la cache
+    """
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.entries),
+                "maxEntries": self.maxEntries, "hitRate": self.hits / lookups if lookups else 0.0}
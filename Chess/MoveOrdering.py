@@ -0,0 +1,116 @@
+"""
+Ordenacion de movimientos para la busqueda alfa-beta. Cuanto antes se mire el mejor movimiento, mas ramas se cortan.
+El orden es: el movimiento de la tabla de transposiciones (el mejor de la busqueda anterior), las capturas y promociones
+ordenadas por MVV-LVA (la victima mas valiosa con el atacante menos valioso primero), los dos movimientos asesinos
+(killer moves) de esa profundidad y el resto de movimientos segun la heuristica de historia.
+Uso del benchmark: python -m Chess.MoveOrdering [--depth N]
+"""
+
+from Chess.Evaluation import pieceScore
+
+MAX_PLY = 64
+TT_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+PROMOTION_SCORE = 100000 + 10 * pieceScore['Q']
+KILLER_SCORES = (90000, 80000) # Primer y segundo movimiento asesino
+HISTORY_MAX = 50000 # La historia nunca pasa de aqui para que no se ponga por delante de los asesinos
+# Valor del atacante para MVV-LVA (el rey es el atacante menos deseable)
+ATTACKER_VALUES = {"p": 1, "N": 3, "B": 3, "R": 5, "Q": 10, "K": 20}
+
+class MoveOrdering():
+    def __init__(self):
+        self.killers = [[None, None] for ply in range(MAX_PLY)] # moveID de los dos asesinos de cada ply
+        # Puntuacion de historia por color y moveID (casilla de origen y destino)
+        self.history = [0] * (2 * 4096)
+
+    """
+    Llamar antes de cada busqueda: se borran los asesinos y la historia se reduce a la mitad para que pese mas lo reciente
+    """
+    def newSearch(self):
+        for killers in self.killers:
+            killers[0] = None
+            killers[1] = None
+        history = self.history
+        for i in range(len(history)):
+            history[i] >>= 1
+
+    """
+    Ordena la lista de movimientos (en el sitio) del mas prometedor al menos prometedor
+    """
+    def orderMoves(self, moves, ply, ttMoveID, whiteToMove):
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history
+        colorOffset = 0 if whiteToMove else 4096
+        scores = {}
+        for move in moves:
+            moveID = move.moveID
+            if moveID == ttMoveID:
+                score = TT_MOVE_SCORE
+            elif move.isCapture:
+                score = CAPTURE_SCORE + 10 * pieceScore[move.pieceCaptured[1]] - ATTACKER_VALUES[move.pieceMoved[1]]
+                if move.isPawnPromotion:
+                    score += 10 * pieceScore['Q']
+            elif move.isPawnPromotion:
+                score = PROMOTION_SCORE
+            elif moveID == killers[0]:
+                score = KILLER_SCORES[0]
+            elif moveID == killers[1]:
+                score = KILLER_SCORES[1]
+            else:
+                score = history[colorOffset + moveID]
+            scores[moveID] = score
+        moves.sort(key=lambda move: scores[move.moveID], reverse=True)
+
+    """
+    Se llama cuando un movimiento produce un corte beta. Si es un movimiento tranquilo (sin captura ni promocion) pasa a
+    ser el primer asesino de ese ply y suma a su historia segun la profundidad que quedaba
+    """
+    def updateCutoff(self, move, ply, depth, whiteToMove):
+        if move.isCapture or move.isPawnPromotion:
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move.moveID:
+                killers[1] = killers[0]
+                killers[0] = move.moveID
+        index = (0 if whiteToMove else 4096) + move.moveID
+        self.history[index] = min(HISTORY_MAX, self.history[index] + depth * depth)
+
+'''
+Compara los nodos buscados a la misma profundidad con y sin ordenar los movimientos
+'''
+def main(argv=None):
+    import argparse
+    import time
+    from Chess import ChessEngine, Perft, SmartMoveFinder
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.MoveOrdering",
+                                     description="Nodos buscados con y sin ordenacion de movimientos")
+    parser.add_argument("--depth", type=int, default=3, help="profundidad de la busqueda")
+    args = parser.parse_args(argv)
+
+    positions = [position for position in Perft.REFERENCE_POSITIONS if position["name"] in
+                 ("start", "kiwipete", "position3", "position4", "position5", "position6")]
+    totals = {False: 0, True: 0}
+    for position in positions:
+        line = "%-10s" % position["name"]
+        for ordering in (False, True):
+            SmartMoveFinder.USE_MOVE_ORDERING = ordering
+            SmartMoveFinder.transpositionTable.clear()
+            gs = ChessEngine.GameState()
+            gs.loadFEN(position["fen"])
+            validMoves = gs.getValidMoves()
+            validMoves.sort(key=lambda move: move.moveID) # Mismo orden inicial en las dos busquedas
+            startTime = time.perf_counter()
+            SmartMoveFinder.findBestMove(gs, validMoves, args.depth, shuffle=False)
+            seconds = time.perf_counter() - startTime
+            totals[ordering] += SmartMoveFinder.nodeCount
+            line += "  %s: %8d nodos %6.2fs" % ("con orden" if ordering else "sin orden", SmartMoveFinder.nodeCount,
+                                                seconds)
+        print(line)
+    SmartMoveFinder.USE_MOVE_ORDERING = True
+    print("Total: %d -> %d nodos (%.1f%% menos)" % (totals[False], totals[True],
+                                                     100 * (1 - totals[True] / totals[False])))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Libro de aperturas. Se construye a partir de partidas en PGN y se guarda en un fichero binario ordenado con registros
+(clave Zobrist, movimiento, peso) de tamaño fijo. Para consultarlo se mapea el fichero en memoria (mmap) y se hace una
+busqueda binaria, asi no hay que leer nada al arrancar y el tamaño del libro no ocupa memoria del proceso.
+Construir: python -m Chess.OpeningBook build partidas.pgn [--output book.bin] [--max-ply N] [--min-count N]
+Consultar: python -m Chess.OpeningBook probe [--fen FEN]
+"""
+
+import mmap
+import os
+import random
+import struct
+from Chess import ChessEngine
+
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+RECORD = struct.Struct(">QHH") # Clave Zobrist, Move.encode() y peso
+BOOK_MAX_PLY = 20 # Medios movimientos de cada partida que entran en el libro
+BOOK_MIN_COUNT = 2 # Veces que se tiene que haber jugado un movimiento para entrar en el libro
+MAX_WEIGHT = 0xFFFF
+
+class OpeningBook():
+    def __init__(self, path=DEFAULT_BOOK_PATH):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.numRecords = size // RECORD.size
+        # Un fichero vacio no se puede mapear
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.numRecords else b""
+
+    def close(self):
+        if self.numRecords:
+            self.data.close()
+        self.file.close()
+
+    """
+    Devuelve la lista de (Move.encode(), peso) guardada para esa clave Zobrist
+    """
+    def probe(self, key):
+        data = self.data
+        low = 0
+        high = self.numRecords
+        # Primer registro con clave >= key
+        while low < high:
+            middle = (low + high) // 2
+            if RECORD.unpack_from(data, middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.numRecords:
+            recordKey, code, weight = RECORD.unpack_from(data, low * RECORD.size)
+            if recordKey != key:
+                break
+            entries.append((code, weight))
+            low += 1
+        return entries
+
+    """
+    Elige un movimiento del libro para la posicion (al azar segun los pesos) de entre validMoves, o None si no hay
+    """
+    def getMove(self, gs, validMoves, rng=random):
+        entries = self.probe(gs.zobristKey)
+        if not entries:
+            return None
+        movesByCode = {move.encode(): move for move in validMoves}
+        candidates = [(movesByCode[code], weight) for code, weight in entries if code in movesByCode]
+        if not candidates:
+            return None
+        return rng.choices([move for move, weight in candidates], [weight for move, weight in candidates])[0]
+
+'''
+Busca entre validMoves el movimiento escrito en notacion algebraica (SAN, por ejemplo "Nbd7", "exd5", "e8=Q+", "O-O").
+Las promociones a otra pieza se toman como promocion a reina, que es la unica que hace el motor
+'''
+def moveFromSAN(san, validMoves):
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        endCol = 6 if len(san) == 3 else 2
+        for move in validMoves:
+            if move.isCastleMove and move.endCol == endCol:
+                return move
+        return None
+    if '=' in san:
+        san = san[:san.index('=')]
+    elif len(san) > 2 and san[-1] in "QRBN" and san[-2].isdigit(): # Promocion sin "=" (e8Q)
+        san = san[:-1]
+    if len(san) < 2:
+        return None
+    piece = san[0] if san[0] in "KQRBN" else 'p'
+    target = san[-2:]
+    if target[0] not in ChessEngine.Move.filesToCols or target[1] not in ChessEngine.Move.ranksToRows:
+        return None
+    endRow = ChessEngine.Move.ranksToRows[target[1]]
+    endCol = ChessEngine.Move.filesToCols[target[0]]
+    disambiguation = san[1 if piece != 'p' else 0:-2].replace('x', '')
+    for move in validMoves:
+        if move.pieceMoved[1] != piece or move.endRow != endRow or move.endCol != endCol:
+            continue
+        if any((char in ChessEngine.Move.filesToCols and ChessEngine.Move.filesToCols[char] != move.startCol) or
+               (char in ChessEngine.Move.ranksToRows and ChessEngine.Move.ranksToRows[char] != move.startRow)
+               for char in disambiguation):
+            continue
+        return move
+    return None
+
+'''
+Quita de la parte de movimientos de una partida los comentarios ({...} y ; hasta el final de la linea), las variantes
+((...), pueden ir anidadas), los numeros de movimiento, las anotaciones ($1) y el resultado. Devuelve la lista de
+movimientos en SAN
+'''
+def sanMoves(moveText):
+    text = []
+    depth = 0
+    inComment = False
+    inLineComment = False
+    for char in moveText:
+        if inComment:
+            inComment = char != '}'
+        elif inLineComment:
+            inLineComment = char != '\n'
+        elif char == '{':
+            inComment = True
+        elif char == ';':
+            inLineComment = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            text.append(char)
+    moves = []
+    for token in "".join(text).split():
+        token = token.split('.')[-1] # "1.e4" o "1...e5"
+        if not token or token[0] == '$' or token in ("1-0", "0-1", "1/2-1/2", "*"):
+            continue
+        moves.append(token)
+    return moves
+
+'''
+Lee un fichero PGN partida a partida. Devuelve cada partida como su lista de movimientos en SAN
+'''
+def readPGN(pgnFile):
+    moveText = []
+    for line in pgnFile:
+        if line.startswith('['):
+            if moveText:
+                yield sanMoves("".join(moveText))
+                moveText = []
+        else:
+            moveText.append(line)
+    if moveText:
+        yield sanMoves("".join(moveText))
+
+'''
+Cuenta cuantas veces se ha jugado cada movimiento en cada posicion (las maxPly primeras jugadas de cada partida) y
+escribe el libro ordenado por clave. Devuelve (partidas, registros escritos)
+'''
+def buildBook(pgnPaths, outputPath=DEFAULT_BOOK_PATH, maxPly=BOOK_MAX_PLY, minCount=BOOK_MIN_COUNT):
+    counts = {}
+    games = 0
+    for path in pgnPaths:
+        with open(path, encoding="utf-8", errors="replace") as pgnFile:
+            for moves in readPGN(pgnFile):
+                if not moves:
+                    continue
+                games += 1
+                gs = ChessEngine.GameState()
+                for san in moves[:maxPly]:
+                    move = moveFromSAN(san, gs.getValidMoves())
+                    if move is None: # Movimiento que no se entiende o ilegal, el resto de la partida no vale
+                        break
+                    record = (gs.zobristKey, move.encode())
+                    counts[record] = counts.get(record, 0) + 1
+                    gs.makeMove(move)
+    records = sorted((key, code, min(count, MAX_WEIGHT)) for (key, code), count in counts.items() if count >= minCount)
+    with open(outputPath, "wb") as bookFile:
+        for record in records:
+            bookFile.write(RECORD.pack(*record))
+    return games, len(records)
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.OpeningBook", description="Libro de aperturas")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="construir el libro a partir de partidas PGN")
+    build.add_argument("pgn", nargs="+", help="ficheros PGN")
+    build.add_argument("--output", default=DEFAULT_BOOK_PATH, help="fichero del libro")
+    build.add_argument("--max-ply", type=int, default=BOOK_MAX_PLY, help="medios movimientos por partida")
+    build.add_argument("--min-count", type=int, default=BOOK_MIN_COUNT, help="veces minimas que se ha jugado")
+    probe = subparsers.add_parser("probe", help="movimientos del libro para una posicion")
+    probe.add_argument("--book", default=DEFAULT_BOOK_PATH, help="fichero del libro")
+    probe.add_argument("--fen", default=None, help="posicion (por defecto la inicial)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        startTime = time.perf_counter()
+        games, records = buildBook(args.pgn, args.output, args.max_ply, args.min_count)
+        print("%d partidas, %d registros (%d bytes) en %.2fs" % (games, records, records * RECORD.size,
+                                                                 time.perf_counter() - startTime))
+    else:
+        book = OpeningBook(args.book)
+        gs = ChessEngine.GameState(fen=args.fen)
+        movesByCode = {move.encode(): move for move in gs.getValidMoves()}
+        startTime = time.perf_counter()
+        entries = book.probe(gs.zobristKey)
+        microseconds = (time.perf_counter() - startTime) * 1000000
+        total = sum(weight for code, weight in entries)
+        for code, weight in sorted(entries, key=lambda entry: -entry[1]):
+            move = movesByCode.get(code)
+            print("%-8s %6d %5.1f%%" % (move.getChessNotation() if move else "?", weight, 100 * weight / total))
+        print("%d movimientos de %d registros en %.1f us" % (len(entries), book.numRecords, microseconds))
+        book.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Busqueda en paralelo con varios procesos (con hilos no se gana nada por el GIL). Los movimientos de la raiz se reparten
+entre los procesos de un ProcessPoolExecutor y cada uno hace la busqueda normal de SmartMoveFinder (profundizacion
+iterativa con su propia tabla de transposiciones) solo con sus movimientos. La posicion se manda en FEN junto con los
+moveID de los movimientos, no se manda el GameState entero.
+Uso del benchmark: python -m Chess.ParallelSearch [--depth N] [--max-workers N]
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+from Chess import ChessEngine, SmartMoveFinder
+from Chess.SearchStats import sumStats
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+STOP_POLL_SECONDS = 0.02 # Cada cuanto mira el proceso principal si hay que cortar la busqueda mientras espera
+
+executor = None
+executorWorkers = 0
+workerStopEvent = None # multiprocessing.Event compartido con los procesos para cortar su busqueda
+
+'''
+Devuelve el pool de procesos, se crea la primera vez y se vuelve a crear si cambia el numero de procesos. Los procesos
+se reutilizan entre busquedas, asi cada uno mantiene su tabla de transposiciones
+'''
+def getExecutor(workers):
+    global executor, executorWorkers, workerStopEvent
+    if executor is None or executorWorkers != workers:
+        shutdownExecutor()
+        # El evento se pasa al crear los procesos, no se puede mandar con cada busqueda
+        workerStopEvent = multiprocessing.Event()
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(workerStopEvent,))
+        executorWorkers = workers
+    return executor
+
+'''
+Se ejecuta en cada proceso al arrancar: se guarda el evento para cortar la busqueda
+'''
+def initWorker(stopEvent):
+    global workerStopEvent
+    workerStopEvent = stopEvent
+
+'''
+Cierra los procesos (llamar al salir del programa)
+'''
+def shutdownExecutor():
+    global executor, executorWorkers
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        executor = None
+        executorWorkers = 0
+
+'''
+Lo que hace cada proceso: carga la posicion, se queda con sus movimientos de la raiz y los busca. Devuelve los resultados
+de cada profundidad terminada, los nodos buscados y su SearchStats. El tiempo se descuenta desde que se lanzo la busqueda (startTime es
+time.time() del proceso principal). La busqueda se corta cuando el proceso principal activa workerStopEvent
+'''
+def searchWorker(fen, bitboards, moveIDs, maxDepth, timeLimit, nodeLimit, shuffle, startTime):
+    gs = ChessEngine.GameState(bitboards, fen)
+    moveIDs = set(moveIDs)
+    validMoves = [move for move in gs.getValidMoves() if move.moveID in moveIDs]
+    if timeLimit is not None:
+        timeLimit = max(1, timeLimit - (time.time() - startTime) * 1000)
+    SmartMoveFinder.findBestMove(gs, validMoves, maxDepth, timeLimit, nodeLimit, shuffle, workers=1,
+                                 stopEvent=workerStopEvent, useBook=False)
+    return SmartMoveFinder.depthResults, SmartMoveFinder.nodeCount, SmartMoveFinder.searchStats
+
+'''
+Igual que SmartMoveFinder.findBestMove pero repartiendo los movimientos de la raiz entre workers procesos. Como cada
+proceso puede llegar a una profundidad distinta, se elige el mejor movimiento de la mayor profundidad que han terminado
+todos. Deja en SmartMoveFinder bestScore, completedDepth y nodeCount (la suma de todos los procesos), y en
+SmartMoveFinder.searchStats los contadores de todos los procesos y un registro de la profundidad elegida (con la variante
+principal del proceso del mejor movimiento), que tambien se pasa a onIteration. onDepth se llama una vez con ese resultado.
+Mientras espera, el proceso principal corta la busqueda de todos los procesos si se activa stopEvent o se pasa
+SmartMoveFinder.searchDeadline (que puede cambiar con SmartMoveFinder.ponderHit)
+'''
+def findBestMoveParallel(gs, validMoves, maxDepth=SmartMoveFinder.MOVEMENT_DEPTH, timeLimit=None, nodeLimit=None,
+                         shuffle=True, workers=DEFAULT_WORKERS, onDepth=None, onIteration=None, stopEvent=None):
+    # El pool siempre tiene workers procesos (si cambiara de tamaño se perderian sus tablas de transposiciones), pero no
+    # se mandan mas tareas que movimientos
+    tasks = min(workers, len(validMoves))
+    fen = gs.getFEN()
+    bitboards = type(gs) is not ChessEngine.GameState
+    # Ordenar antes de repartir para que los movimientos mas prometedores queden en procesos distintos
+    SmartMoveFinder.moveOrdering.orderMoves(validMoves, 0, None, gs.whiteToMove)
+    startTime = time.time()
+    pool = getExecutor(workers)
+    workerStopEvent.clear()
+    futures = []
+    for i in range(tasks):
+        moveIDs = [move.moveID for move in validMoves[i::tasks]]
+        futures.append(pool.submit(searchWorker, fen, bitboards, moveIDs, maxDepth, timeLimit,
+                                   nodeLimit // tasks if nodeLimit is not None else None, shuffle, startTime))
+    pending = futures
+    while pending:
+        done, pending = wait(pending, STOP_POLL_SECONDS, FIRST_EXCEPTION)
+        deadline = SmartMoveFinder.searchDeadline
+        if not workerStopEvent.is_set() and ((stopEvent is not None and stopEvent.is_set()) or
+                                             (deadline is not None and time.perf_counter() > deadline)):
+            workerStopEvent.set()
+            for future in pending: # Los que aun no han empezado ya no se buscan
+                future.cancel()
+    results = [future.result() for future in futures if not future.cancelled()]
+
+    SmartMoveFinder.nodeCount = sum(nodes for depthResults, nodes, stats in results)
+    depth = min((len(depthResults) for depthResults, nodes, stats in results), default=0)
+    bestMove = None
+    bestScore = -SmartMoveFinder.CHECKMATE_POINTS
+    bestStats = None
+    movesByID = {move.moveID: move for move in validMoves}
+    for depthResults, nodes, stats in results:
+        SmartMoveFinder.searchStats.merge(stats)
+        if depth == 0:
+            continue
+        resultDepth, score, moveID = depthResults[depth - 1]
+        if moveID is not None and (bestMove is None or score > bestScore):
+            bestScore = score
+            bestMove = movesByID[moveID]
+            bestStats = stats
+    SmartMoveFinder.bestScore = bestScore
+    SmartMoveFinder.completedDepth = depth
+    if bestMove is not None:
+        pv = movesFromNotation(gs, bestStats.iterations[depth - 1]["pv"])
+        record = SmartMoveFinder.searchStats.endIteration(depth, bestScore, pv, SmartMoveFinder.nodeCount, gs)
+        record["tt"] = sumStats([stats.iterations[depth - 1]["tt"] for depthResults, nodes, stats in results])
+        if onDepth is not None:
+            onDepth(depth, bestScore, bestMove)
+        if onIteration is not None:
+            onIteration(record)
+    return bestMove
+
+'''
+Pasa una lista de movimientos en notacion getChessNotation (la variante principal de un proceso) a movimientos de gs,
+hasta el primero que no se encuentre. gs queda como estaba
+'''
+def movesFromNotation(gs, notations):
+    moves = []
+    for notation in notations:
+        move = None
+        for candidate in gs.getValidMoves():
+            if candidate.getChessNotation() == notation:
+                move = candidate
+                break
+        if move is None:
+            break
+        gs.makeMove(move)
+        moves.append(move)
+    for i in range(len(moves)):
+        gs.undoMove()
+    return moves
+
+'''
+Tiempo en llegar a la misma profundidad con 1, 2, ... N procesos
+'''
+def main(argv=None):
+    import argparse
+    from Chess import Perft
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.ParallelSearch",
+                                     description="Tiempo hasta una profundidad con 1 a N procesos")
+    parser.add_argument("--depth", type=int, default=3, help="profundidad de la busqueda")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_WORKERS, help="numero maximo de procesos")
+    args = parser.parse_args(argv)
+
+    positions = [position for position in Perft.REFERENCE_POSITIONS if position["name"] in
+                 ("start", "kiwipete", "position3", "position4", "position5", "position6")]
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        if workers > 1:
+            # Arrancar los procesos antes de medir
+            pool = getExecutor(workers)
+            list(pool.map(time.sleep, [0.1] * workers))
+        total = 0.0
+        nodes = 0
+        for position in positions:
+            SmartMoveFinder.transpositionTable.clear()
+            gs = ChessEngine.GameState()
+            gs.loadFEN(position["fen"])
+            validMoves = gs.getValidMoves()
+            validMoves.sort(key=lambda move: move.moveID)
+            startTime = time.perf_counter()
+            SmartMoveFinder.findBestMove(gs, validMoves, args.depth, shuffle=False, workers=workers)
+            total += time.perf_counter() - startTime
+            nodes += SmartMoveFinder.nodeCount
+        shutdownExecutor()
+        if baseline is None:
+            baseline = total
+        print("%2d procesos: %7.2fs %9d nodos %8.0f nodos/s  x%.2f" % (workers, total, nodes, nodes / total,
+                                                                       baseline / total))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Perft: cuenta los nodos del arbol de movimientos legales hasta una profundidad. Sirve para comprobar que el generador
+de movimientos (GameState.getValidMoves) es correcto comparando con los valores conocidos de posiciones de referencia, y
+para medir su velocidad en nodos por segundo.
+Uso: python -m Chess.Perft [--depth N] [--fen FEN] [--divide] [--queen-only] [--bitboards] [--json]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from Chess import ChessEngine
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Posiciones de referencia (inicial, "Kiwipete" y posiciones de en passant, enroque y promocion) con el numero de nodos
+# por profundidad contando las 4 promociones posibles. Como el motor solo promociona a reina, en las posiciones con
+# promociones se guardan tambien los nodos contando solo la promocion a reina ("queenOnly"); donde no aparece una
+# profundidad en "queenOnly" los dos valores son iguales. "depth" es la profundidad que se ejecuta por defecto
+REFERENCE_POSITIONS = [
+    {"name": "start", "fen": START_FEN,
+     "nodes": {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}, "depth": 4},
+    {"name": "kiwipete", "fen": "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     "nodes": {1: 48, 2: 2039, 3: 97862, 4: 4085603}, "queenOnly": {4: 4074224}, "depth": 3},
+    {"name": "position3", "fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     "nodes": {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}, "depth": 4},
+    {"name": "position4", "fen": "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     "nodes": {1: 6, 2: 264, 3: 9467, 4: 422333}, "queenOnly": {2: 228, 3: 8087, 4: 320802}, "depth": 3},
+    {"name": "position5", "fen": "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     "nodes": {1: 44, 2: 1486, 3: 62379}, "queenOnly": {1: 41, 2: 1373, 3: 54007}, "depth": 3},
+    {"name": "position6", "fen": "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     "nodes": {1: 46, 2: 2079, 3: 89890, 4: 3894594}, "depth": 3},
+    {"name": "illegal-ep-pin", "fen": "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     "nodes": {1: 18, 2: 92, 3: 1670, 4: 10138, 5: 185429, 6: 1134888}, "queenOnly": {6: 1132035}, "depth": 5},
+    {"name": "ep-gives-check", "fen": "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     "nodes": {1: 15, 2: 126, 3: 1928, 4: 13931, 5: 206379, 6: 1440467},
+     "queenOnly": {5: 206136, 6: 1438912}, "depth": 5},
+    {"name": "castle-gives-check", "fen": "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+     "nodes": {1: 15, 2: 66, 3: 1198, 4: 6399, 5: 120330, 6: 661072}, "depth": 5},
+    {"name": "castle-queenside", "fen": "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+     "nodes": {1: 16, 2: 71, 3: 1286, 4: 7418, 5: 141077, 6: 803711}, "depth": 5},
+    {"name": "castle-rights", "fen": "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+     "nodes": {1: 26, 2: 1141, 3: 27826, 4: 1274206}, "depth": 3},
+    {"name": "castle-prevented", "fen": "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+     "nodes": {1: 44, 2: 1494, 3: 50509, 4: 1720476}, "depth": 3},
+    {"name": "promote-out-of-check", "fen": "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     "nodes": {1: 11, 2: 133, 3: 1442, 4: 19174, 5: 266199, 6: 3821001},
+     "queenOnly": {1: 5, 2: 75, 3: 694, 4: 9674, 5: 128641, 6: 1783549}, "depth": 4},
+    {"name": "discovered-check", "fen": "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+     "nodes": {1: 29, 2: 165, 3: 5160, 4: 31961, 5: 1004658}, "queenOnly": {4: 30674, 5: 963213}, "depth": 4},
+    {"name": "promote-to-check", "fen": "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     "nodes": {1: 9, 2: 40, 3: 472, 4: 2661, 5: 38983, 6: 217342},
+     "queenOnly": {1: 6, 2: 28, 3: 248, 4: 1379, 5: 18382, 6: 96431}, "depth": 5},
+    {"name": "underpromote-to-check", "fen": "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+     "nodes": {1: 6, 2: 27, 3: 273, 4: 1329, 5: 18135, 6: 92683},
+     "queenOnly": {1: 3, 2: 13, 3: 111, 4: 553, 5: 7461, 6: 35337}, "depth": 5},
+    {"name": "self-stalemate", "fen": "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     "nodes": {1: 2, 2: 6, 3: 13, 4: 63, 5: 382, 6: 2217}, "queenOnly": {5: 331, 6: 1924}, "depth": 6},
+    {"name": "stalemate-checkmate", "fen": "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     "nodes": {1: 10, 2: 25, 3: 268, 4: 926, 5: 10857, 6: 43261, 7: 567584},
+     "queenOnly": {1: 7, 2: 19, 3: 129, 4: 498, 5: 4217, 6: 18519, 7: 188160}, "depth": 5},
+    {"name": "double-check", "fen": "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+     "nodes": {1: 37, 2: 183, 3: 6559, 4: 23527}, "depth": 4},
+]
+
+'''
+Cambia la reina que deja makeMove al promocionar por otra pieza. Solo se usa para contar tambien las promociones a
+torre, alfil y caballo, ya que el motor solo promociona a reina
+'''
+def setPromotedPiece(gs, move, piece):
+    oldPiece = gs.board[move.endRow][move.endCol]
+    gs.board[move.endRow][move.endCol] = piece
+    sq = move.endRow * 8 + move.endCol
+    gs.zobristKey ^= ChessEngine.ZOBRIST_PIECES[oldPiece][sq] ^ ChessEngine.ZOBRIST_PIECES[piece][sq]
+    gs.zobristLog[-1] = gs.zobristKey
+    gs.materialScore += ChessEngine.MATERIAL_SCORES[piece] - ChessEngine.MATERIAL_SCORES[oldPiece]
+    gs.positionScore += ChessEngine.POSITION_SCORES[piece][sq] - ChessEngine.POSITION_SCORES[oldPiece][sq]
+    if hasattr(gs, 'pieceBitboards'): # Variante con bitboards
+        gs.pieceBitboards[oldPiece] ^= 1 << sq
+        gs.pieceBitboards[piece] ^= 1 << sq
+
+'''
+Numero de nodos hoja a la profundidad dada. Con queenOnly=False cada promocion cuenta como 4 movimientos (reina, torre,
+alfil y caballo), igual que en los valores de referencia
+'''
+def perft(gs, depth, queenOnly=False):
+    if depth == 0:
+        return 1
+    moves = gs.getValidMoves()
+    if depth == 1 and queenOnly:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        if depth == 1: # Al ultimo nivel no hace falta hacer el movimiento
+            nodes += 4 if move.isPawnPromotion else 1
+            continue
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1, queenOnly)
+        if move.isPawnPromotion and not queenOnly:
+            color = move.pieceMoved[0]
+            for piece in ('R', 'B', 'N'):
+                setPromotedPiece(gs, move, color + piece)
+                nodes += perft(gs, depth - 1, queenOnly)
+            setPromotedPiece(gs, move, color + 'Q')
+        gs.undoMove()
+    return nodes
+
+'''
+Nodos por cada movimiento de la raiz (para buscar en que movimiento esta la diferencia con otro generador)
+'''
+def divide(gs, depth, queenOnly=False):
+    results = {}
+    for move in gs.getValidMoves():
+        promotions = ('q',) if queenOnly or not move.isPawnPromotion else ('q', 'r', 'b', 'n')
+        gs.makeMove(move)
+        for promotion in promotions:
+            if promotion != 'q':
+                setPromotedPiece(gs, move, move.pieceMoved[0] + promotion.upper())
+            name = move.getChessNotation() + (promotion if move.isPawnPromotion else '')
+            results[name] = perft(gs, depth - 1, queenOnly)
+        if len(promotions) > 1:
+            setPromotedPiece(gs, move, move.pieceMoved[0] + 'Q')
+        gs.undoMove()
+    return results
+
+'''
+Ejecuta perft en una posicion y devuelve los nodos, el tiempo y los nodos por segundo
+'''
+def runPerft(fen, depth, queenOnly=False, bitboards=False):
+    gs = ChessEngine.GameState(bitboards=bitboards)
+    gs.loadFEN(fen)
+    gs.moveCache = None # Se mide el generador de movimientos, sin cache
+    startTime = time.perf_counter()
+    nodes = perft(gs, depth, queenOnly)
+    seconds = time.perf_counter() - startTime
+    return {"fen": fen, "depth": depth, "nodes": nodes, "seconds": round(seconds, 4),
+            "nps": int(nodes / seconds) if seconds > 0 else 0}
+
+'''
+Nodos esperados de una posicion de referencia a esa profundidad (None si no se conocen)
+'''
+def expectedNodes(position, depth, queenOnly):
+    if queenOnly and depth in position.get("queenOnly", {}):
+        return position["queenOnly"][depth]
+    return position["nodes"].get(depth)
+
+'''
+Ejecuta las posiciones de referencia. Con maxDepth se limita la profundidad de cada posicion
+'''
+def runSuite(maxDepth=None, queenOnly=False, bitboards=False, names=None):
+    results = []
+    for position in REFERENCE_POSITIONS:
+        if names and position["name"] not in names:
+            continue
+        depth = position["depth"] if maxDepth is None else min(maxDepth, max(position["nodes"]))
+        result = runPerft(position["fen"], depth, queenOnly, bitboards)
+        result["name"] = position["name"]
+        result["expected"] = expectedNodes(position, depth, queenOnly)
+        result["ok"] = result["expected"] is None or result["expected"] == result["nodes"]
+        results.append(result)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Chess.Perft", description="Perft del generador de movimientos")
+    parser.add_argument("--depth", type=int, help="profundidad (en la suite, maxima profundidad por posicion)")
+    parser.add_argument("--fen", help="posicion a analizar en vez de las posiciones de referencia")
+    parser.add_argument("--position", action="append", help="ejecutar solo esta posicion de referencia (por nombre)")
+    parser.add_argument("--divide", action="store_true", help="mostrar los nodos por cada movimiento de la raiz")
+    parser.add_argument("--queen-only", action="store_true", help="contar solo la promocion a reina, como el motor")
+    parser.add_argument("--bitboards", action="store_true", help="usar la variante de GameState con bitboards")
+    parser.add_argument("--json", action="store_true", help="salida en JSON")
+    args = parser.parse_args(argv)
+
+    if args.fen or args.divide:
+        fen = args.fen or START_FEN
+        depth = args.depth or 1
+        if args.divide:
+            gs = ChessEngine.GameState(bitboards=args.bitboards)
+            gs.loadFEN(fen)
+            results = divide(gs, depth, args.queen_only)
+            if args.json:
+                print(json.dumps({"fen": fen, "depth": depth, "divide": results, "nodes": sum(results.values())}))
+            else:
+                for move in sorted(results):
+                    print(move + ": " + str(results[move]))
+                print("Nodos: " + str(sum(results.values())))
+            return 0
+        result = runPerft(fen, depth, args.queen_only, args.bitboards)
+        print(json.dumps(result) if args.json else
+              "Nodos: %d  Tiempo: %.2fs  NPS: %d" % (result["nodes"], result["seconds"], result["nps"]))
+        return 0
+
+    results = runSuite(args.depth, args.queen_only, args.bitboards, args.position)
+    allOk = all(result["ok"] for result in results)
+    if args.json:
+        totalNodes = sum(result["nodes"] for result in results)
+        totalSeconds = sum(result["seconds"] for result in results)
+        print(json.dumps({"queenOnly": args.queen_only, "bitboards": args.bitboards, "ok": allOk,
+                          "nodes": totalNodes, "seconds": round(totalSeconds, 4),
+                          "nps": int(totalNodes / totalSeconds) if totalSeconds > 0 else 0, "results": results}))
+    else:
+        for result in results:
+            status = "OK" if result["ok"] else "ERROR (esperado %d)" % result["expected"]
+            print("%-22s depth %d  %10d nodos  %8.2fs  %8d nps  %s" % (result["name"], result["depth"],
+                                                                     result["nodes"], result["seconds"],
+                                                                     result["nps"], status))
+    return 0 if allOk else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
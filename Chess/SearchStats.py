@@ -0,0 +1,206 @@
+"""
+Estadisticas de la busqueda de SmartMoveFinder: nodos, hojas, nodos de quiescencia, cortes beta (y cuantos con el primer
+movimiento), factor de ramificacion efectivo, tiempo generando movimientos, ordenandolos y evaluando, uso de la tabla de
+transposiciones y de la cache de movimientos, y la variante principal. findBestMove deja las de la ultima busqueda en
+SmartMoveFinder.searchStats y findBestMoveWithStats las devuelve junto al movimiento. Al terminar cada profundidad se
+guarda un registro (diccionario) que se puede recibir con onIteration o escribir en un fichero JSONL (JSONLWriter).
+Uso: python -m Chess.SearchStats [--fen FEN] [--depth N | --time MS] [--jsonl fichero]
+"""
+
+import json
+import time
+
+class SearchStats():
+    def __init__(self, source="search"):
+        self.source = source # "search", "book", "tablebase" o "parallel"
+        self.nodes = 0
+        self.leafNodes = 0 # Nodos que se puntuan sin mirar ningun movimiento
+        self.quiescenceNodes = 0
+        self.betaCutoffs = 0
+        self.firstMoveCutoffs = 0 # Cortes beta con el primer movimiento que se mira (lo bien que se ordena)
+        self.ttCutoffs = 0 # Nodos resueltos con la tabla de transposiciones
+        self.moveGenSeconds = 0.0 # getValidMoves y getCaptureMoves
+        self.orderSeconds = 0.0 # Ordenar movimientos
+        self.evalSeconds = 0.0 # Puntuar posiciones (scoreBoard y stand pat)
+        self.seconds = 0.0
+        self.iterations = [] # Registro de cada profundidad terminada
+        self.startTime = time.perf_counter()
+        self.ttStart = None
+        self.moveCacheStart = None
+
+    """
+    Llamar al empezar la busqueda, para contar solo el uso de las tablas durante esta busqueda
+    """
+    def start(self, gs, transpositionTable):
+        self.startTime = time.perf_counter()
+        self.ttStart = transpositionTable.getStats()
+        self.moveCacheStart = gs.moveCache.getStats() if gs.moveCache is not None else None
+
+    """
+    Registro de una profundidad terminada. nodes es el total de nodos hasta ahora y pv la lista de movimientos de la variante
+    principal o una funcion que la devuelve. La funcion se llama despues de tomar el tiempo y el uso de las tablas, asi lo que
+    cuesta sacar la variante no cuenta en la busqueda. Sin transpositionTable el registro no lleva "tt". Se guarda en
+    iterations y se devuelve
+    """
+    def endIteration(self, depth, score, pv, nodes, gs, transpositionTable=None):
+        self.nodes = nodes
+        self.seconds = time.perf_counter() - self.startTime
+        previousNodes = self.iterations[-1]["nodes"] if self.iterations else 0
+        iterationNodes = nodes - previousNodes
+        previousIterationNodes = self.iterations[-1]["iterationNodes"] if self.iterations else 0
+        record = {"depth": depth, "score": round(score, 3), "move": None, "pv": [], "nodes": nodes,
+                  "iterationNodes": iterationNodes,
+                  "branchingFactor": round(iterationNodes / previousIterationNodes, 3) if previousIterationNodes else None,
+                  "seconds": round(self.seconds, 6), "nps": round(self.getNPS())}
+        record.update(self.getCounters())
+        if transpositionTable is not None:
+            record["tt"] = statsDelta(transpositionTable.getStats(), self.ttStart)
+        if self.moveCacheStart is not None and gs.moveCache is not None:
+            record["moveCache"] = statsDelta(gs.moveCache.getStats(), self.moveCacheStart)
+        if callable(pv):
+            pv = pv()
+        record["move"] = pv[0].getChessNotation() if pv else None
+        record["pv"] = [move.getChessNotation() for move in pv]
+        self.iterations.append(record)
+        return record
+
+    """
+    Llamar al terminar la busqueda (aunque se haya cortado a mitad de una profundidad)
+    """
+    def finish(self, nodes):
+        self.nodes = nodes
+        self.seconds = time.perf_counter() - self.startTime
+
+    """
+    Suma los contadores de otra busqueda (la de cada proceso en la busqueda en paralelo). Los tiempos de cada fase quedan
+    sumados entre todos los procesos
+    """
+    def merge(self, other):
+        self.leafNodes += other.leafNodes
+        self.quiescenceNodes += other.quiescenceNodes
+        self.betaCutoffs += other.betaCutoffs
+        self.firstMoveCutoffs += other.firstMoveCutoffs
+        self.ttCutoffs += other.ttCutoffs
+        self.moveGenSeconds += other.moveGenSeconds
+        self.orderSeconds += other.orderSeconds
+        self.evalSeconds += other.evalSeconds
+
+    def getFirstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.betaCutoffs if self.betaCutoffs else 0.0
+
+    """
+    Factor de ramificacion efectivo: nodos de la ultima profundidad terminada entre los de la anterior
+    """
+    def getBranchingFactor(self):
+        for record in reversed(self.iterations):
+            if record["branchingFactor"] is not None:
+                return record["branchingFactor"]
+        return None
+
+    def getNPS(self):
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    def getCounters(self):
+        return {"leafNodes": self.leafNodes, "quiescenceNodes": self.quiescenceNodes, "betaCutoffs": self.betaCutoffs,
+                "firstMoveCutoffRate": round(self.getFirstMoveCutoffRate(), 4), "ttCutoffs": self.ttCutoffs,
+                "moveGenSeconds": round(self.moveGenSeconds, 6), "orderSeconds": round(self.orderSeconds, 6),
+                "evalSeconds": round(self.evalSeconds, 6)}
+
+    """
+    Resumen de toda la busqueda (lo de la ultima profundidad terminada y los contadores totales)
+    """
+    def toDict(self):
+        last = self.iterations[-1] if self.iterations else {}
+        summary = {"source": self.source, "depth": last.get("depth", 0), "score": last.get("score"),
+                   "pv": last.get("pv", []), "nodes": self.nodes, "seconds": round(self.seconds, 6),
+                   "nps": round(self.getNPS()), "branchingFactor": self.getBranchingFactor()}
+        summary.update(self.getCounters())
+        if "tt" in last:
+            summary["tt"] = last["tt"]
+        if "moveCache" in last:
+            summary["moveCache"] = last["moveCache"]
+        return summary
+
+'''
+Diferencia entre dos getStats (de TranspositionTable o MoveCache): lo contado desde start. Los ratios se recalculan y lo
+que no es un contador (tamaño, entradas) se deja como esta
+'''
+def statsDelta(stats, start):
+    delta = dict(stats)
+    for name in ("hits", "misses", "collisions", "stores", "evictions"):
+        if name in stats:
+            delta[name] = stats[name] - start[name]
+    lookups = delta["hits"] + delta["misses"] + delta.get("collisions", 0)
+    delta["hitRate"] = round(delta["hits"] / lookups, 4) if lookups else 0.0
+    return delta
+
+'''
+Suma varios getStats (por ejemplo los "tt" de los registros de cada proceso) y recalcula hitRate
+'''
+def sumStats(statsList):
+    total = {}
+    for name in ("hits", "misses", "collisions", "stores", "evictions"):
+        if statsList and all(name in stats for stats in statsList):
+            total[name] = sum(stats[name] for stats in statsList)
+    lookups = total.get("hits", 0) + total.get("misses", 0) + total.get("collisions", 0)
+    total["hitRate"] = round(total.get("hits", 0) / lookups, 4) if lookups else 0.0
+    return total
+
+'''
+Escribe cada registro que recibe como una linea JSON (se puede pasar como onIteration a findBestMove)
+'''
+class JSONLWriter():
+    def __init__(self, path):
+        self.file = open(path, "a")
+
+    def __call__(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def main(argv=None):
+    import argparse
+    from Chess import ChessEngine, SmartMoveFinder
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.SearchStats",
+                                     description="Estadisticas de la busqueda de una posicion")
+    parser.add_argument("--fen", default=None, help="posicion (por defecto la inicial)")
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument("--depth", type=int, default=None, help="profundidad de la busqueda")
+    limit.add_argument("--time", type=int, default=None, help="milisegundos de busqueda")
+    parser.add_argument("--jsonl", default=None, help="escribir el registro de cada profundidad en este fichero")
+    args = parser.parse_args(argv)
+
+    gs = ChessEngine.GameState(fen=args.fen)
+    validMoves = gs.getValidMoves()
+    depth = args.depth if args.depth is not None else SmartMoveFinder.MAX_DEPTH if args.time is not None else 4
+    writer = JSONLWriter(args.jsonl) if args.jsonl else None
+
+    def onIteration(record):
+        print("profundidad %2d  %9d nodos  %8.0f nodos/s  ebf %5s  cortes 1er mov %5.1f%%  pv %s" %
+              (record["depth"], record["nodes"], record["nps"], record["branchingFactor"],
+               100 * record["firstMoveCutoffRate"], " ".join(record["pv"])))
+        if writer is not None:
+            writer(record)
+
+    bestMove, stats = SmartMoveFinder.findBestMoveWithStats(gs, validMoves, depth, args.time, shuffle=False,
+                                                            useBook=False, onIteration=onIteration)
+    if writer is not None:
+        writer.close()
+    summary = stats.toDict()
+    searchSeconds = summary["seconds"]
+    print("mejor movimiento %s, %d nodos (%d hojas, %d de quiescencia) en %.3fs" %
+          (bestMove.getChessNotation() if bestMove is not None else "-", summary["nodes"], summary["leafNodes"],
+           summary["quiescenceNodes"], searchSeconds))
+    for name, key in (("generar movimientos", "moveGenSeconds"), ("ordenar", "orderSeconds"), ("evaluar", "evalSeconds")):
+        print("  %-20s %8.3fs %5.1f%%" % (name, summary[key], 100 * summary[key] / searchSeconds if searchSeconds else 0))
+    if "tt" in summary:
+        print("  tabla de transposiciones: %(hits)d aciertos, %(misses)d fallos, %(collisions)d colisiones, "
+              "%(stores)d guardados" % summary["tt"])
+    if "moveCache" in summary:
+        print("  cache de movimientos: %(hits)d aciertos, %(misses)d fallos" % summary["moveCache"])
+
+if __name__ == "__main__":
+    main()
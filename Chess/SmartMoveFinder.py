@@ -3,74 +3,51 @@ Esta clase es responsable de calcular los mejores movimientos que pueda hacer la
 jugar en contra del usuario
 """
 
+import os
 import random
-
-pieceScore = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "p": 1}
-
-# Evaluacion de puntuacion para los caballos (mejor que no se vayan a las columnas 1 o 8) y otras piezas
-knightPositionScores = [[1, 1, 1, 1, 1, 1, 1, 1],
-                        [1, 2, 2, 2, 2, 2, 2, 1],
-                        [1000, 2, 3, 3, 3, 3, 2, 1000],
-                        [-1, 2, 3, 4, 4, 3, 2, -1],
-                        [-1, 2, 3, 4, 4, 3, 2, -1],
-                        [-1, 2, 3, 3, 3, 3, 2, -1],
-                        [1, 2, 2, 2, 2, 2, 2, 1],
-                        [1, 1, 1, 1, 1, 1, 1, 1]]
-
-# Buscamos las diagonales con los alfiles
-bishopPositionScores = [[4, 3, 2, 1, 1, 2, 3, 4],
-                        [3, 4, 3, 2, 2, 3, 4, 3],
-                        [2, 3, 4, 3, 3, 4, 3, 2],
-                        [1, 2, 3, 4, 4, 3, 2, 1],
-                        [1, 2, 3, 4, 4, 3, 2, 1],
-                        [2, 3, 4, 3, 3, 4, 3, 2],
-                        [3, 4, 3, 2, 2, 3, 4, 3],
-                        [4, 3, 2, 1, 1, 2, 3, 4]]
-
-# Cuanto mas por el centro la reina mejor
-queenPositionScores = [[1, 1, 1, 3, 1, 1, 1, 1],
-                       [1, 2, 3, 3, 3, 1, 1, 1],
-                       [1, 4, 3, 3, 3, 4, 2, 1],
-                       [1, 2, 3, 3, 3, 2, 2, 1],
-                       [1, 2, 3, 3, 3, 2, 2, 1],
-                       [1, 4, 3, 3, 3, 4, 2, 1],
-                       [1, 1, 2, 3, 3, 1, 1, 1],
-                       [1, 1, 1, 3, 1, 1, 1, 1]]
-
-rookPositionScores = [[6, 2, 4, 4, 4, 4, 2, 6],
-                      [1, 4, 4, 4, 4, 4, 4, 1],
-                      [1, 1, 2, 3, 3, 2, 1, 1],
-                      [1, 2, 3, 4, 4, 3, 2, 1],
-                      [1, 2, 3, 4, 4, 3, 2, 1],
-                      [1, 1, 2, 3, 3, 2, 1, 1],
-                      [1, 4, 4, 4, 4, 4, 4, 1],
-                      [6, 2, 4, 4, 4, 4, 2, 6]]
-
-whitePawnPositionScores = [[8, 8, 8, 8, 8, 8, 8, 8],
-                           [8, 8, 8, 8, 8, 8, 8, 8],
-                           [5, 6, 6, 7, 7, 6, 6, 5],
-                           [2, 3, 3, 5, 5, 3, 3, 2],
-                           [1, 2, 3, 4, 4, 3, 2, 1],
-                           [1, 1, 2, 3, 3, 2, 1, 1],
-                           [0, 1, 1, 0, 0, 1, 1, 0],
-                           [0, 0, 0, 0, 0, 0, 0, 0]]
-
-blackPawnPositionScores = [[0, 0, 0, 0, 0, 0, 0, 0],
-                           [0, 1, 1, 0, 0, 1, 1, 0],
-                           [1, 1, 2, 3, 3, 2, 1, 1],
-                           [1, 2, 3, 4, 4, 3, 2, 1],
-                           [1, 3, 3, 5, 5, 3, 3, 1],
-                           [5, 6, 6, 7, 7, 6, 6, 5],
-                           [8, 8, 8, 8, 8, 8, 8, 8],
-                           [8, 8, 8, 8, 8, 8, 8, 8]]
-
-
-piecePositionScores = {"N": knightPositionScores, "Q": queenPositionScores, "B": bishopPositionScores, "R": rookPositionScores, "bp": blackPawnPositionScores,
-                       "wp": whitePawnPositionScores}
+import sys
+import time
+from Chess.Evaluation import pieceScore, piecePositionScores
+from Chess.MoveOrdering import MoveOrdering, MAX_PLY
+from Chess.OpeningBook import OpeningBook, DEFAULT_BOOK_PATH
+from Chess.SearchStats import SearchStats, JSONLWriter
+from Chess.Tablebase import Tablebase, WIN, LOSS
+from Chess.TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
 
 CHECKMATE_POINTS = 1000
 STALEMATE_POINTS = 0
 MOVEMENT_DEPTH = 2 # Movimientos a futuro a calcular
+MAX_DEPTH = 8 # Profundidad maxima cuando se busca con limite de tiempo o de nodos
+TIME_LIMIT_MS = 1000 # Tiempo que piensa la IA por movimiento
+TIME_CHECK_INTERVAL = 128 # Cada cuantos nodos se mira el reloj
+TT_SIZE_MB = 16 # Memoria de la tabla de transposiciones
+QUIESCENCE_MAX_DEPTH = 8 # Capturas seguidas como maximo en la busqueda de quiescencia
+DELTA_MARGIN = 2 # Margen de la poda delta (si ni ganando la pieza y este margen se llega a alpha, no se mira la captura)
+USE_MOVE_ORDERING = True # Ordenar movimientos (MVV-LVA, asesinos e historia), si no solo va primero el de la tabla
+USE_OPENING_BOOK = True # Mirar primero el libro de aperturas (si existe el fichero DEFAULT_BOOK_PATH)
+USE_TABLEBASES = True # Usar las tablas de finales (Tablebase) si se han generado
+TABLEBASE_WIN_POINTS = 900 # Puntuacion de una posicion ganada segun las tablas (menos un punto por medio movimiento)
+TABLEBASE_PIECES = 3 # Piezas (con los reyes) de KQK, KRK y KPK, solo con estas o menos se mira en las tablas
+SEARCH_WORKERS = 1 # Procesos de la busqueda (con mas de 1 se reparten los movimientos, ver ParallelSearch)
+SEARCH_STATS_JSONL = None # Fichero donde se añade el registro de cada profundidad de todas las busquedas (None para no)
+
+transpositionTable = TranspositionTable(TT_SIZE_MB)
+moveOrdering = MoveOrdering()
+openingBook = None # Se abre la primera vez que hace falta (getOpeningBook)
+openingBookLoaded = False
+tablebase = Tablebase()
+nextMove = None
+rootDepth = MOVEMENT_DEPTH
+nodeCount = 0
+searchStartTime = 0.0
+searchDeadline = None
+searchNodeLimit = None
+searchStopEvent = None # threading.Event para cancelar la busqueda desde otro hilo
+bestScore = 0 # Puntuacion (para el jugador que mueve) del mejor movimiento de la ultima busqueda
+completedDepth = 0 # Ultima profundidad terminada en la ultima busqueda
+depthResults = [] # (profundidad, puntuacion, moveID del mejor movimiento) de cada profundidad terminada
+searchStats = SearchStats() # Estadisticas de la ultima busqueda
+searchStatsWriter = None # JSONLWriter de SEARCH_STATS_JSONL, se abre en la primera busqueda
 
 '''
 Coge un movimiento aleatorio de la lista y lo devuelve
@@ -104,7 +81,7 @@ def findBestMoveMinMaxNoRecursion(gs, validMoves):
                 elif gs.stalemate:
                     score = STALEMATE_POINTS
                 else:
-                    score = -turnMultiplier * scoreMaterial(gs.board)
+                    score = -turnMultiplier * gs.materialScore
                 if score > opponentMaxScore:
                     opponentMaxScore = score
                 gs.undoMove()
@@ -115,40 +92,363 @@ def findBestMoveMinMaxNoRecursion(gs, validMoves):
     return bestPlayerMove
 
 '''
-Función de ayuda para hacer la primera llamada recursiva
+Libro de aperturas o None si no hay fichero del libro
 '''
-def findBestMove(gs, validMoves):
-    global nextMove
-    nextMove = None
-    random.shuffle(validMoves)
-    findMoveNegaMaxAlphaBeta(gs, validMoves, MOVEMENT_DEPTH, -CHECKMATE_POINTS, CHECKMATE_POINTS, 1 if gs.whiteToMove else -1)
-    return nextMove
+def getOpeningBook():
+    global openingBook, openingBookLoaded
+    if not openingBookLoaded:
+        openingBookLoaded = True
+        if os.path.exists(DEFAULT_BOOK_PATH):
+            openingBook = OpeningBook(DEFAULT_BOOK_PATH)
+    return openingBook
+
+'''
+Función de ayuda para hacer la primera llamada recursiva. Si se pasa stopEvent (un threading.Event), la busqueda se corta
+en cuanto se activa desde otro hilo. onDepth(depth, score, move) se llama al terminar cada profundidad y
+onIteration(registro) con el registro de SearchStats de esa profundidad. Si la posicion esta en el libro de aperturas (y
+useBook o USE_OPENING_BOOK) se devuelve un movimiento del libro sin buscar
+'''
+def findBestMove(gs, validMoves, maxDepth=MOVEMENT_DEPTH, timeLimit=None, nodeLimit=None, shuffle=True,
+                 workers=None, stopEvent=None, onDepth=None, useBook=None, onIteration=None):
+    global nextMove, rootDepth, nodeCount, searchStartTime, searchDeadline, searchNodeLimit, searchStopEvent, bestScore, \
+        completedDepth, depthResults, searchStats, searchStatsWriter
+    if useBook is None:
+        useBook = USE_OPENING_BOOK
+    if onIteration is None and SEARCH_STATS_JSONL is not None:
+        if searchStatsWriter is None:
+            searchStatsWriter = JSONLWriter(SEARCH_STATS_JSONL)
+        onIteration = searchStatsWriter
+    if useBook and getOpeningBook() is not None:
+        bookMove = openingBook.getMove(gs, validMoves)
+        if bookMove is not None:
+            nodeCount = 0
+            bestScore = 0
+            completedDepth = 0
+            depthResults = []
+            searchStats = SearchStats("book")
+            return bookMove
+    if USE_TABLEBASES and gs.pieceCount <= TABLEBASE_PIECES:
+        tablebaseMove = tablebase.getBestMove(gs, validMoves)
+        if tablebaseMove is not None:
+            gs.makeMove(tablebaseMove)
+            nodeCount = len(validMoves)
+            bestScore = -tablebaseScore(tablebase.probe(gs))
+            gs.undoMove()
+            completedDepth = 0
+            depthResults = []
+            searchStats = SearchStats("tablebase")
+            searchStats.finish(nodeCount)
+            return tablebaseMove
+    if workers is None:
+        workers = SEARCH_WORKERS
+    if workers > 1 and len(validMoves) > 1:
+        from Chess.ParallelSearch import findBestMoveParallel # Import aqui para no tener un import circular
+        # Cada proceso devuelve sus estadisticas y findBestMoveParallel las suma en searchStats
+        searchStats = SearchStats("parallel")
+        searchStats.start(gs, transpositionTable)
+        # Con el limite de tiempo aqui tambien funciona ponderHit, el proceso principal corta a los demas
+        searchStartTime = time.perf_counter()
+        searchDeadline = searchStartTime + timeLimit / 1000 if timeLimit is not None else None
+        bestMove = findBestMoveParallel(gs, validMoves, maxDepth, timeLimit, nodeLimit, shuffle, workers, onDepth,
+                                        onIteration, stopEvent)
+        searchStats.finish(nodeCount)
+        return bestMove
+    bestMove = None
+    bestScore = 0
+    completedDepth = 0
+    depthResults = []
+    if shuffle: # Para que la IA no juegue siempre igual entre movimientos con la misma puntuacion
+        random.shuffle(validMoves)
+    transpositionTable.newSearch()
+    moveOrdering.newSearch()
+    nodeCount = 0
+    searchStartTime = time.perf_counter()
+    searchDeadline = searchStartTime + timeLimit / 1000 if timeLimit is not None else None
+    searchNodeLimit = nodeLimit
+    searchStopEvent = stopEvent
+    searchStats = SearchStats()
+    searchStats.start(gs, transpositionTable)
+    moveLogLength = len(gs.moveLog)
+    # Busqueda por profundizacion iterativa: se busca a profundidad 1, 2, 3... hasta maxDepth o hasta que se acabe el
+    # tiempo o los nodos. Siempre se devuelve el mejor movimiento de la ultima profundidad terminada
+    for depth in range(1, maxDepth + 1):
+        rootDepth = depth
+        nextMove = None
+        try:
+            score = findMoveNegaMaxAlphaBeta(gs, validMoves, depth, -CHECKMATE_POINTS, CHECKMATE_POINTS,
+                                             1 if gs.whiteToMove else -1)
+        except SearchAborted:
+            # Deshacer los movimientos que se quedaron hechos al cortar la busqueda
+            while len(gs.moveLog) > moveLogLength:
+                gs.undoMove()
+            break
+        if nextMove is not None: # Sin movimiento (no deberia pasar) se queda el de la profundidad anterior
+            bestMove = nextMove
+        bestScore = score
+        completedDepth = depth
+        depthResults.append((depth, score, bestMove.moveID if bestMove is not None else None))
+        record = searchStats.endIteration(depth, score, lambda: getPrincipalVariation(gs, bestMove, depth), nodeCount,
+                                          gs, transpositionTable)
+        if onDepth is not None:
+            onDepth(depth, score, bestMove)
+        if onIteration is not None:
+            onIteration(record)
+        if score >= CHECKMATE_POINTS: # Ya hemos encontrado un jaque mate
+            break
+        # Si ya se ha usado la mitad del tiempo la siguiente profundidad no va a terminar
+        if searchDeadline is not None and \
+                time.perf_counter() - searchStartTime > (searchDeadline - searchStartTime) / 2:
+            break
+    searchStats.finish(nodeCount)
+    return bestMove
+
+'''
+Igual que findBestMove pero devuelve (mejor movimiento, SearchStats de la busqueda)
+'''
+def findBestMoveWithStats(gs, validMoves, *args, **kwargs):
+    bestMove = findBestMove(gs, validMoves, *args, **kwargs)
+    return bestMove, searchStats
+
+'''
+Variante principal: el movimiento elegido y los siguientes mejores movimientos guardados en la tabla de transposiciones
+(como mucho maxLength movimientos, se para si se repite una posicion). No pasa por la cache de movimientos ni cuenta en
+las estadisticas de la tabla, asi no cambia las estadisticas de la busqueda
+'''
+def getPrincipalVariation(gs, firstMove, maxLength):
+    pv = []
+    seen = set()
+    move = firstMove
+    while move is not None and len(pv) < maxLength and gs.zobristKey not in seen:
+        seen.add(gs.zobristKey)
+        gs.makeMove(move)
+        pv.append(move)
+        entry = transpositionTable.peek(gs.zobristKey)
+        move = None
+        if entry is not None and entry[3] is not None:
+            for candidate in gs.generateValidMoves():
+                if candidate.moveID == entry[3]:
+                    move = candidate
+                    break
+    for i in range(len(pv)):
+        gs.undoMove()
+    return pv
+
+'''
+Movimiento que se espera del rival en esta posicion (el mejor movimiento guardado en la tabla de transposiciones) o None.
+Sirve para pensar durante el turno del rival (pondering)
+'''
+def getPonderMove(gs, validMoves):
+    entry = transpositionTable.peek(gs.zobristKey)
+    if entry is None or entry[3] is None:
+        return None
+    for move in validMoves:
+        if move.moveID == entry[3]:
+            return move
+    return None
+
+'''
+El rival ha jugado el movimiento esperado: la busqueda que estaba pensando sin limite (desde otro hilo) pasa a tener
+timeLimit milisegundos contados desde que empezo a pensar. Si el rival ha tardado mas que eso la busqueda se corta ya y
+devuelve el mejor movimiento de la ultima profundidad terminada
+'''
+def ponderHit(timeLimit):
+    global searchDeadline
+    searchDeadline = searchStartTime + timeLimit / 1000
+
+'''
+Excepcion para cortar la busqueda cuando se acaba el tiempo o los nodos
+'''
+class SearchAborted(Exception):
+    pass
 
 def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
+    global nextMove, nodeCount
+    nodeCount += 1
+    # La profundidad 1 siempre se termina para tener al menos un movimiento
+    if rootDepth > 1:
+        if searchNodeLimit is not None and nodeCount > searchNodeLimit:
+            raise SearchAborted()
+        if nodeCount % TIME_CHECK_INTERVAL == 0 and ((searchDeadline is not None and time.perf_counter() > searchDeadline)
+                                                     or (searchStopEvent is not None and searchStopEvent.is_set())):
+            raise SearchAborted()
+    # Final que esta en las tablas: la puntuacion es exacta
+    if USE_TABLEBASES and depth != rootDepth and not gs.checkmate and gs.pieceCount <= TABLEBASE_PIECES:
+        result = tablebase.probe(gs)
+        if result is not None:
+            searchStats.leafNodes += 1
+            return tablebaseScore(result)
     if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
+        if gs.checkmate or gs.stalemate:
+            searchStats.leafNodes += 1
+            return turnMultiplier * scoreBoard(gs)
+        # En vez de parar aqui (aunque haya un intercambio a medias) seguimos buscando solo las capturas
+        return quiescenceSearch(gs, validMoves, alpha, beta, turnMultiplier, QUIESCENCE_MAX_DEPTH)
+
+    # Mirar si la posicion ya se ha buscado antes (por otro orden de movimientos) a la misma profundidad o mas
+    originalAlpha = alpha
+    ttMoveID = None
+    entry = transpositionTable.probe(gs.zobristKey)
+    if entry is not None:
+        ttDepth, ttScore, ttBound, ttMoveID = entry
+        if ttDepth >= depth and depth != rootDepth: # En la raiz hay que buscar para tener nextMove
+            if ttBound == EXACT:
+                searchStats.ttCutoffs += 1
+                return ttScore
+            elif ttBound == LOWER_BOUND:
+                alpha = max(alpha, ttScore)
+            else:
+                beta = min(beta, ttScore)
+            if alpha >= beta:
+                searchStats.ttCutoffs += 1
+                return ttScore
 
-    # Ordenar movimientos - IMPLEMENTAR MAS ADELANTE
-    maxScore = -CHECKMATE_POINTS
+    # Ordenar movimientos: el mejor de la busqueda anterior (el de la profundidad anterior en la raiz) va el primero
+    ply = rootDepth - depth
+    stats = searchStats
+    startTime = time.perf_counter()
+    if USE_MOVE_ORDERING:
+        moveOrdering.orderMoves(validMoves, ply, ttMoveID, gs.whiteToMove)
+    elif ttMoveID is not None:
+        orderMoveFirst(validMoves, ttMoveID)
+    stats.orderSeconds += time.perf_counter() - startTime
+    if not validMoves: # Jaque mate o ahogado
+        stats.leafNodes += 1
+    # En la raiz se empieza por debajo del mate para elegir siempre un movimiento, aunque todos lleven a recibir mate
+    maxScore = -CHECKMATE_POINTS - 1 if depth == rootDepth else -CHECKMATE_POINTS
+    bestMove = None
     for move in validMoves:
         gs.makeMove(move)
+        startTime = time.perf_counter()
         nextMoves = gs.getValidMoves()
+        stats.moveGenSeconds += time.perf_counter() - startTime
         score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
         if score > maxScore:
             maxScore = score
-            if depth == MOVEMENT_DEPTH:
+            bestMove = move
+            if depth == rootDepth:
                 nextMove = move
         gs.undoMove()
         # Aqui se elimina de manera selectiva las ramas
         if maxScore > alpha:
             alpha = maxScore
         if alpha >= beta:
+            moveOrdering.updateCutoff(move, ply, depth, gs.whiteToMove)
+            stats.betaCutoffs += 1
+            if move is validMoves[0]:
+                stats.firstMoveCutoffs += 1
             break
+
+    if maxScore <= originalAlpha:
+        bound = UPPER_BOUND
+    elif maxScore >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    transpositionTable.store(gs.zobristKey, depth, maxScore, bound, bestMove)
     return maxScore
 
 '''
-Puntuacion positiva buena para blancas, puntuación negativa buena para negras
+Puntuacion para el jugador que mueve de un resultado de Tablebase.probe: cuanto antes llegue el mate, mejor
+'''
+def tablebaseScore(result):
+    outcome, plies = result
+    if outcome == WIN:
+        return TABLEBASE_WIN_POINTS - plies
+    elif outcome == LOSS:
+        return -(TABLEBASE_WIN_POINTS - plies)
+    return STALEMATE_POINTS
+
+'''
+Busqueda de quiescencia: al llegar a la profundidad 0 se siguen mirando solo las capturas (y promociones) hasta que la
+posicion esta tranquila. El jugador puede no capturar y quedarse con la puntuacion actual (stand pat). Si esta en jaque se
+miran todos los movimientos, ya que no puede quedarse quieto. validMoves son los movimientos de la posicion si ya se han
+generado (en el primer nivel), si no se generan solo las capturas
+'''
+def quiescenceSearch(gs, validMoves, alpha, beta, turnMultiplier, depth):
+    global nodeCount
+    nodeCount += 1
+    stats = searchStats
+    stats.quiescenceNodes += 1
+    if rootDepth > 1:
+        if searchNodeLimit is not None and nodeCount > searchNodeLimit:
+            raise SearchAborted()
+        if nodeCount % TIME_CHECK_INTERVAL == 0 and ((searchDeadline is not None and time.perf_counter() > searchDeadline)
+                                                     or (searchStopEvent is not None and searchStopEvent.is_set())):
+            raise SearchAborted()
+
+    if validMoves is None:
+        startTime = time.perf_counter()
+        captures = gs.getCaptureMoves()
+        if gs.inCheck: # Hay que salir del jaque, se miran todos los movimientos
+            moves = gs.getValidMoves()
+        stats.moveGenSeconds += time.perf_counter() - startTime
+        if gs.inCheck and gs.checkmate:
+            stats.leafNodes += 1
+            return -CHECKMATE_POINTS
+    else:
+        captures = None
+        moves = validMoves
+    startTime = time.perf_counter()
+    standPat = turnMultiplier * (gs.materialScore + gs.positionScore * .1)
+    stats.evalSeconds += time.perf_counter() - startTime
+    if gs.inCheck:
+        if depth == 0:
+            stats.leafNodes += 1
+            return standPat
+        maxScore = -CHECKMATE_POINTS
+    else:
+        if captures is None:
+            captures = [move for move in validMoves if move.isCapture or move.isPawnPromotion]
+        moves = captures
+        # Stand pat: no capturar ya es suficiente para el corte
+        if standPat >= beta or depth == 0:
+            stats.leafNodes += 1
+            return standPat
+        maxScore = standPat
+        if standPat > alpha:
+            alpha = standPat
+
+    startTime = time.perf_counter()
+    moveOrdering.orderMoves(moves, MAX_PLY, None, gs.whiteToMove)
+    stats.orderSeconds += time.perf_counter() - startTime
+    searched = 0
+    for move in moves:
+        # Poda delta: ni ganando la pieza capturada (y la reina si promociona) se llegaria a alpha
+        if not gs.inCheck:
+            gain = pieceScore[move.pieceCaptured[1]] if move.isCapture else 0
+            if move.isPawnPromotion:
+                gain += pieceScore['Q'] - pieceScore['p']
+            if standPat + gain + DELTA_MARGIN <= alpha:
+                continue
+        gs.makeMove(move)
+        score = -quiescenceSearch(gs, None, -beta, -alpha, -turnMultiplier, depth - 1)
+        gs.undoMove()
+        searched += 1
+        if score > maxScore:
+            maxScore = score
+        if maxScore > alpha:
+            alpha = maxScore
+        if alpha >= beta:
+            stats.betaCutoffs += 1
+            if searched == 1:
+                stats.firstMoveCutoffs += 1
+            break
+    if searched == 0: # Posicion tranquila (o todas las capturas podadas): se queda la puntuacion estatica
+        stats.leafNodes += 1
+    return maxScore
+
+'''
+Pone el movimiento con ese moveID al principio de la lista
+'''
+def orderMoveFirst(moves, moveID):
+    for i in range(len(moves)):
+        if moves[i].moveID == moveID:
+            moves[0], moves[i] = moves[i], moves[0]
+            return
+
+'''
+Puntuacion positiva buena para blancas, puntuación negativa buena para negras. GameState lleva la puntuacion de material
+y de posicion al dia en cada movimiento, asi que no hace falta recorrer el tablero
 '''
 def scoreBoard(gs):
     if gs.checkmate:
@@ -159,7 +459,22 @@ def scoreBoard(gs):
     elif gs.stalemate:
         return STALEMATE_POINTS
 
-    score = 0
+    return gs.materialScore + gs.positionScore * .1 # Multiplicarlo por .1 para que siga teniendo en cuenta las otras casillas
+
+'''
+Puntuacion recorriendo todo el tablero (da lo mismo que scoreBoard, sirve para comprobarlo)
+'''
+def scoreBoardFullScan(gs):
+    if gs.checkmate:
+        if gs.whiteToMove:
+            return -CHECKMATE_POINTS
+        else:
+            return CHECKMATE_POINTS
+    elif gs.stalemate:
+        return STALEMATE_POINTS
+
+    material = 0
+    position = 0
     for row in range(len(gs.board)):
         for col in range(len(gs.board[row])):
             square = gs.board[row][col]
@@ -173,11 +488,13 @@ def scoreBoard(gs):
                         piecePositionScore = piecePositionScores[square[1]][row][col]
 
                 if square[0] == 'w':
-                    score += pieceScore[square[1]] + piecePositionScore * .1 # Multiplicarlo por .1 para que siga teniendo en cuenta las otras casillas
+                    material += pieceScore[square[1]]
+                    position += piecePositionScore
                 elif square[0] == 'b':
-                    score -= pieceScore[square[1]] - piecePositionScore * .1
+                    material -= pieceScore[square[1]]
+                    position += piecePositionScore
 
-    return score
+    return material + position * .1
 
 '''
 Puntuar el tablero segun las piezas
@@ -192,3 +509,46 @@ def scoreMaterial(board):
                 score -= pieceScore[square[1]]
 
     return score
+
+'''
+Posiciones para comprobar la busqueda: (nombre, FEN, movimientos que se aceptan o None si vale cualquier movimiento
+legal). En todas y a cualquier profundidad findBestMove tiene que devolver un movimiento
+'''
+SEARCH_CHECKS = [
+    ("perdida KQK", "k7/8/1K6/8/8/8/8/7Q b - - 0 1", None), # Todos los movimientos reciben mate
+    ("mate en 1", "k7/8/1K6/8/8/8/8/7Q w - - 0 1", {"h1h8", "h1b7"}),
+]
+
+'''
+Comprueba las posiciones de SEARCH_CHECKS con profundidad 1 a maxDepth. Devuelve la lista de fallos
+'''
+def checkSearch(maxDepth=4, bitboards=False):
+    from Chess import ChessEngine # Import aqui porque ChessEngine no hace falta para buscar
+    failures = []
+    for name, fen, expected in SEARCH_CHECKS:
+        for depth in range(1, maxDepth + 1):
+            gs = ChessEngine.GameState(bitboards, fen)
+            validMoves = gs.getValidMoves()
+            move = findBestMove(gs, validMoves, depth, shuffle=False, workers=1, useBook=False)
+            notation = move.getChessNotation() if move is not None else None
+            if move is None or move not in validMoves or (expected is not None and notation not in expected):
+                failures.append("%s, profundidad %d: %s" % (name, depth, notation))
+    return failures
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.SmartMoveFinder",
+                                     description="Comprueba la busqueda en las posiciones de SEARCH_CHECKS")
+    parser.add_argument("--depth", type=int, default=4, help="profundidad maxima")
+    parser.add_argument("--bitboards", action="store_true", help="usar la variante de GameState con bitboards")
+    args = parser.parse_args(argv)
+
+    failures = checkSearch(args.depth, args.bitboards)
+    for failure in failures:
+        print("FALLO " + failure)
+    print("%d posiciones, %d fallos" % (len(SEARCH_CHECKS), len(failures)))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
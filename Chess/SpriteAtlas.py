@@ -0,0 +1,58 @@
+"""
+Imagenes de las piezas en un solo fichero (atlas): las 12 piezas ya escaladas a un tamaño de casilla, una al lado de otra
+en el orden de PIECES. Se construye una vez (python -m Chess.SpriteAtlas [--size N]) y al arrancar basta con cargar un PNG
+en vez de cargar y escalar 12. Los ficheros se buscan como recursos del paquete Chess.images, asi se encuentran se lance el
+juego desde donde se lance y tambien desde el ejecutable de PyInstaller.
+"""
+
+from importlib import resources
+import pygame as p
+
+IMAGES_PACKAGE = "Chess.images"
+PIECES = ('wp', 'wR', 'wN', 'wB', 'wK', 'wQ', 'bp', 'bR', 'bN', 'bB', 'bK', 'bQ')
+ATLAS_NAME = "pieces%d.png" # Nombre del atlas para cada tamaño de casilla
+
+'''
+Carga una imagen del paquete de imagenes
+'''
+def loadImage(name):
+    with resources.files(IMAGES_PACKAGE).joinpath(name).open("rb") as imageFile:
+        return p.image.load(imageFile, name)
+
+'''
+Crea el atlas para casillas de size pixeles a partir de las imagenes de cada pieza
+'''
+def buildAtlas(size):
+    atlas = p.Surface((size * len(PIECES), size), p.SRCALPHA)
+    for i, piece in enumerate(PIECES):
+        atlas.blit(p.transform.scale(loadImage(piece + ".png"), (size, size)), (i * size, 0))
+    return atlas
+
+'''
+Devuelve un diccionario pieza -> imagen de size pixeles. Si esta el atlas de ese tamaño cada pieza es una parte de el; si
+no, se cargan y escalan las imagenes sueltas. Hay que llamarla despues de crear la ventana (convert_alpha)
+'''
+def loadPieces(size):
+    atlasFile = resources.files(IMAGES_PACKAGE).joinpath(ATLAS_NAME % size)
+    if atlasFile.is_file():
+        atlas = loadImage(ATLAS_NAME % size).convert_alpha()
+    else:
+        atlas = buildAtlas(size).convert_alpha()
+    return {piece: atlas.subsurface((i * size, 0, size, size)) for i, piece in enumerate(PIECES)}
+
+def main(argv=None):
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.SpriteAtlas",
+                                     description="Construye el atlas de las piezas para un tamaño de casilla")
+    parser.add_argument("--size", type=int, default=64, help="tamaño de la casilla en pixeles")
+    parser.add_argument("--output", default=None, help="fichero del atlas (por defecto en Chess/images)")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "images", ATLAS_NAME % args.size)
+    p.image.save(buildAtlas(args.size), output)
+    print("Atlas de %dx%d guardado en %s" % (args.size * len(PIECES), args.size, output))
+
+if __name__ == "__main__":
+    main()
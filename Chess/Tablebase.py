@@ -0,0 +1,344 @@
+"""
+Tablas de finales (tablebases) con la distancia al mate de los finales de rey y una pieza contra rey (KQK, KRK y KPK).
+Se generan una vez por analisis retrogrado usando las reglas de movimiento de ChessEngine: se parte de las posiciones de
+mate y se va hacia atras capa a capa, asi cada posicion sabe en cuantos medios movimientos se gana.
+Cada tabla es un fichero con una cabecera y un byte por posicion (los medios movimientos hasta el mate o DRAW_VALUE si
+es tablas). El indice sale directamente de las casillas de los reyes y la pieza, asi consultar una posicion es O(1).
+Como las reglas son simetricas de izquierda a derecha, el rey blanco siempre se pone en las columnas a-d.
+Generar: python -m Chess.Tablebase build [KQK KRK KPK] [--workers N]
+Consultar: python -m Chess.Tablebase probe --fen FEN
+Comprobar: python -m Chess.Tablebase verify [KQK KRK KPK]
+"""
+
+import os
+import struct
+from array import array
+from Chess import ChessEngine
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+MATERIALS = {"KQK": 'Q', "KRK": 'R', "KPK": 'p'} # Pieza del bando fuerte en cada final
+HEADER = struct.Struct(">4sB3sI") # Marca, version, final y numero de posiciones
+MAGIC = b"MCTB"
+VERSION = 2 # 2: los ahogados ya no se guardan como mate (hay que volver a generar las tablas de la version 1)
+NUM_POSITIONS = 2 * 32 * 64 * 64 # Turno, rey blanco (columnas a-d), rey negro y pieza
+DRAW_VALUE = 255 # Tablas (o posicion imposible)
+
+# Resultado de una consulta para el jugador que mueve
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# Estado de cada posicion al generar
+ILLEGAL = 0
+NORMAL = 1
+CHECKMATE = 2
+STALEMATE = 3
+
+'''
+Indice de la posicion en la tabla (casillas de 0 a 63, fila * 8 + columna). Si el rey blanco esta en las columnas e-h se
+usa la posicion reflejada
+'''
+def tableIndex(whiteToMove, whiteKing, blackKing, piece):
+    if whiteKing & 7 >= 4:
+        whiteKing ^= 7
+        blackKing ^= 7
+        piece ^= 7
+    return (((0 if whiteToMove else 1) * 32 + (whiteKing >> 3) * 4 + (whiteKing & 7)) * 64 + blackKing) * 64 + piece
+
+class Tablebase():
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        self.tables = {} # Final -> bytes de la tabla (None si no hay fichero)
+
+    """
+    Tabla de ese final o None si no se ha generado
+    """
+    def getTable(self, material):
+        if material not in self.tables:
+            path = os.path.join(self.directory, material + ".tb")
+            table = None
+            if os.path.exists(path):
+                with open(path, "rb") as tableFile:
+                    data = tableFile.read()
+                magic, version, name, count = HEADER.unpack_from(data)
+                if magic == MAGIC and version == VERSION and name.decode() == material and count == NUM_POSITIONS:
+                    table = data[HEADER.size:]
+            self.tables[material] = table
+        return self.tables[material]
+
+    """
+    Devuelve (WIN, DRAW o LOSS para el jugador que mueve, medios movimientos hasta el mate) o None si el material de la
+    posicion no esta en las tablas
+    """
+    def probe(self, gs):
+        piece = None
+        for r in range(8):
+            for square in gs.board[r]:
+                if square != "--" and square[1] != 'K':
+                    if piece is not None:
+                        return None
+                    piece = square
+                    pieceRow = r
+        if piece is None: # Solo quedan los reyes
+            return DRAW, 0
+        table = self.getTable("K" + piece[1].upper() + "K")
+        if table is None:
+            return None
+        pieceSquare = pieceRow * 8 + gs.board[pieceRow].index(piece)
+        whiteKing = gs.whiteKingLocation[0] * 8 + gs.whiteKingLocation[1]
+        blackKing = gs.blackKingLocation[0] * 8 + gs.blackKingLocation[1]
+        if piece[0] == 'w':
+            whiteToMove = gs.whiteToMove
+        else: # Se da la vuelta al tablero para que el bando fuerte sean las blancas
+            whiteKing, blackKing = blackKing ^ 56, whiteKing ^ 56
+            pieceSquare ^= 56
+            whiteToMove = not gs.whiteToMove
+        value = table[tableIndex(whiteToMove, whiteKing, blackKing, pieceSquare)]
+        if value == DRAW_VALUE:
+            return DRAW, 0
+        return (WIN if whiteToMove else LOSS), value
+
+    """
+    El mejor movimiento segun las tablas: el mate mas rapido si se gana, uno que haga tablas si no, o el que mas tarde en
+    recibir mate. None si la posicion no esta en las tablas
+    """
+    def getBestMove(self, gs, validMoves):
+        bestMove = None
+        bestKey = None
+        for move in validMoves:
+            gs.makeMove(move)
+            result = self.probe(gs)
+            gs.undoMove()
+            if result is None:
+                return None
+            outcome, plies = result # Para el rival
+            key = (-outcome, -plies if outcome == LOSS else plies)
+            if bestKey is None or key > bestKey:
+                bestKey = key
+                bestMove = move
+        return bestMove
+
+'''
+Genera las posiciones con el rey blanco en una casilla (una parte de la tabla, para repartirla entre procesos). Para cada
+posicion legal guarda su estado, su numero de movimientos y las aristas (posicion, posicion siguiente). Las promociones
+de KPK van a parte con el indice de la posicion de KQK a la que llevan
+'''
+def generateChunk(material, whiteKingIndex):
+    pieceType = MATERIALS[material]
+    whiteKing = (whiteKingIndex // 4) * 8 + whiteKingIndex % 4
+    gs = ChessEngine.GameState()
+    gs.currentCastlingRight = ChessEngine.CastleRights(False, False, False, False)
+    gs.moveCache = None # Se cambia el tablero a mano, la clave Zobrist no esta al dia
+    emptyRow = ["--"] * 8
+    indexes = array('I')
+    statuses = array('B')
+    moveCounts = array('H')
+    edgeSources = array('I')
+    edgeTargets = array('I')
+    promotions = []
+    for whiteToMove in (True, False):
+        for blackKing in range(64):
+            if abs((blackKing >> 3) - (whiteKing >> 3)) <= 1 and abs((blackKing & 7) - (whiteKing & 7)) <= 1:
+                continue # Reyes juntos (o en la misma casilla)
+            for piece in range(64):
+                if piece == whiteKing or piece == blackKing or (pieceType == 'p' and piece >> 3 in (0, 7)):
+                    continue
+                index = tableIndex(whiteToMove, whiteKing, blackKing, piece)
+                gs.board = [list(emptyRow) for r in range(8)]
+                gs.board[whiteKing >> 3][whiteKing & 7] = "wK"
+                gs.board[blackKing >> 3][blackKing & 7] = "bK"
+                gs.board[piece >> 3][piece & 7] = "w" + pieceType
+                gs.whiteKingLocation = (whiteKing >> 3, whiteKing & 7)
+                gs.blackKingLocation = (blackKing >> 3, blackKing & 7)
+                gs.whiteToMove = whiteToMove
+                gs.enpassantPossible = ()
+                # El rey del que no mueve no puede estar en jaque
+                if whiteToMove and gs.isAttacked(gs.blackKingLocation, 'w'):
+                    continue
+                validMoves = gs.getValidMoves()
+                indexes.append(index)
+                moveCounts.append(len(validMoves))
+                # Se mira la lista de movimientos y no los flags de gs, que es el mismo objeto para todas las posiciones
+                if not validMoves:
+                    statuses.append(CHECKMATE if gs.inCheck else STALEMATE)
+                else:
+                    statuses.append(NORMAL)
+                for move in validMoves:
+                    if move.isCapture: # Solo quedan los reyes: tablas
+                        continue
+                    end = move.endRow * 8 + move.endCol
+                    if move.pieceMoved == "wK":
+                        nextIndex = tableIndex(not whiteToMove, end, blackKing, piece)
+                    elif move.pieceMoved == "bK":
+                        nextIndex = tableIndex(not whiteToMove, whiteKing, end, piece)
+                    elif move.isPawnPromotion:
+                        promotions.append((index, tableIndex(False, whiteKing, blackKing, end)))
+                        continue
+                    else:
+                        nextIndex = tableIndex(not whiteToMove, whiteKing, blackKing, end)
+                    edgeSources.append(index)
+                    edgeTargets.append(nextIndex)
+    return indexes, statuses, moveCounts, edgeSources, edgeTargets, promotions
+
+'''
+Genera la tabla de un final. Las posiciones se generan en paralelo y el analisis retrogrado se hace en este proceso:
+las posiciones con las negras en mate tienen valor 0; una posicion de las blancas gana en n + 1 si tiene un movimiento a
+una posicion de las negras perdida en n; una posicion de las negras pierde en n + 1 cuando todos sus movimientos llevan a
+posiciones ganadas de las blancas (la ultima en decidirse es la de n, la mas larga). Devuelve la tabla (bytearray)
+'''
+def buildTable(material, workers=None, promotionTable=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = list(pool.map(generateChunk, [material] * 32, range(32)))
+
+    statuses = bytearray(NUM_POSITIONS)
+    remaining = array('H', bytes(2 * NUM_POSITIONS)) # Movimientos de las negras que todavia no llevan a una derrota
+    sources = array('I')
+    targets = array('I')
+    levels = {0: []}
+    for indexes, chunkStatuses, moveCounts, edgeSources, edgeTargets, promotions in chunks:
+        for i in range(len(indexes)):
+            statuses[indexes[i]] = chunkStatuses[i]
+            remaining[indexes[i]] = moveCounts[i]
+            if chunkStatuses[i] == CHECKMATE and indexes[i] >= NUM_POSITIONS // 2: # Negras en mate
+                levels[0].append(indexes[i])
+        sources.extend(edgeSources)
+        targets.extend(edgeTargets)
+        # Promocionar en KPK: si la posicion de KQK esta ganada en n, esta se gana como mucho en n + 1
+        for index, queenIndex in promotions:
+            value = promotionTable[queenIndex] if promotionTable is not None else DRAW_VALUE
+            if value != DRAW_VALUE:
+                levels.setdefault(value + 1, []).append(index)
+
+    # Posiciones anteriores de cada posicion (CSR: las de la posicion i van de offsets[i] a offsets[i + 1])
+    offsets = array('I', bytes(4 * (NUM_POSITIONS + 1)))
+    for target in targets:
+        offsets[target + 1] += 1
+    for i in range(NUM_POSITIONS):
+        offsets[i + 1] += offsets[i]
+    fill = array('I', offsets)
+    predecessors = array('I', bytes(4 * len(targets)))
+    for i in range(len(targets)):
+        target = targets[i]
+        predecessors[fill[target]] = sources[i]
+        fill[target] += 1
+    del sources, targets, fill
+
+    table = bytearray([DRAW_VALUE]) * NUM_POSITIONS
+    for level in range(DRAW_VALUE):
+        nextLevel = levels.setdefault(level + 1, [])
+        for index in levels.pop(level, []):
+            if table[index] != DRAW_VALUE:
+                continue
+            table[index] = level
+            blackToMove = index >= NUM_POSITIONS // 2
+            for i in range(offsets[index], offsets[index + 1]):
+                previous = predecessors[i]
+                if table[previous] != DRAW_VALUE:
+                    continue
+                if blackToMove: # Las blancas tienen un movimiento que gana
+                    nextLevel.append(previous)
+                else:
+                    remaining[previous] -= 1
+                    if remaining[previous] == 0: # Todos los movimientos de las negras pierden
+                        nextLevel.append(previous)
+    return table
+
+'''
+Guarda la tabla con su cabecera
+'''
+def saveTable(material, table, directory=TABLEBASE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, material + ".tb")
+    with open(path, "wb") as tableFile:
+        tableFile.write(HEADER.pack(MAGIC, VERSION, material.encode(), NUM_POSITIONS))
+        tableFile.write(table)
+    return path
+
+'''
+Comprueba una tabla contra las posiciones generadas otra vez: los mates tienen que valer 0, los ahogados tablas y ninguna
+otra posicion puede valer 0. Devuelve la lista de (indice, estado, valor guardado) que no cuadran
+'''
+def verifyTable(material, table, workers=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = list(pool.map(generateChunk, [material] * 32, range(32)))
+    errors = []
+    for indexes, statuses, moveCounts, edgeSources, edgeTargets, promotions in chunks:
+        for index, status in zip(indexes, statuses):
+            value = table[index]
+            if (status == CHECKMATE and value != 0) or (status == STALEMATE and value != DRAW_VALUE) or \
+                    (status == NORMAL and value == 0):
+                errors.append((index, status, value))
+    return errors
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.Tablebase", description="Tablas de finales")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="generar las tablas")
+    build.add_argument("materials", nargs="*", default=list(MATERIALS), help="finales (por defecto todos)")
+    build.add_argument("--workers", type=int, default=None, help="numero de procesos (por defecto uno por nucleo)")
+    build.add_argument("--output-dir", default=TABLEBASE_DIR, help="carpeta de las tablas")
+    verify = subparsers.add_parser("verify", help="comprobar los mates y ahogados de las tablas generadas")
+    verify.add_argument("materials", nargs="*", default=list(MATERIALS), help="finales (por defecto todos)")
+    verify.add_argument("--workers", type=int, default=None, help="numero de procesos (por defecto uno por nucleo)")
+    verify.add_argument("--dir", default=TABLEBASE_DIR, help="carpeta de las tablas")
+    probe = subparsers.add_parser("probe", help="consultar una posicion")
+    probe.add_argument("--fen", required=True, help="posicion")
+    probe.add_argument("--dir", default=TABLEBASE_DIR, help="carpeta de las tablas")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        tables = {}
+        # KPK necesita KQK para las promociones
+        materials = sorted(args.materials, key=lambda material: material == "KPK")
+        if "KPK" in materials and "KQK" not in materials:
+            tables["KQK"] = Tablebase(args.output_dir).getTable("KQK")
+            if tables["KQK"] is None:
+                materials.insert(0, "KQK")
+        for material in materials:
+            if material not in MATERIALS:
+                parser.error("final desconocido: " + material)
+            startTime = time.perf_counter()
+            table = buildTable(material, args.workers, tables.get("KQK") if material == "KPK" else None)
+            tables[material] = table
+            path = saveTable(material, table, args.output_dir)
+            wins = sum(1 for value in table if value != DRAW_VALUE)
+            longest = max(value for value in table if value != DRAW_VALUE)
+            print("%s: %.1fs, %d bytes, %d posiciones ganadas, mate mas largo en %d medios movimientos (%s)" %
+                  (material, time.perf_counter() - startTime, os.path.getsize(path), wins, longest, path))
+    elif args.command == "verify":
+        tablebase = Tablebase(args.dir)
+        failed = False
+        for material in args.materials:
+            table = tablebase.getTable(material)
+            if table is None:
+                print("%s: no hay tabla" % material)
+                failed = True
+                continue
+            errors = verifyTable(material, table, args.workers)
+            print("%s: %s" % (material, "%d posiciones mal" % len(errors) if errors else "correcta"))
+            failed = failed or bool(errors)
+        if failed:
+            raise SystemExit(1)
+    else:
+        tablebase = Tablebase(args.dir)
+        gs = ChessEngine.GameState(fen=args.fen)
+        validMoves = gs.getValidMoves()
+        result = tablebase.probe(gs)
+        if result is None:
+            print("La posicion no esta en las tablas")
+            return
+        outcome, plies = result
+        print({WIN: "Gana", DRAW: "Tablas", LOSS: "Pierde"}[outcome] + (" en %d medios movimientos" % plies
+                                                                        if outcome != DRAW else ""))
+        if validMoves:
+            print("Mejor movimiento: " + tablebase.getBestMove(gs, validMoves).getChessNotation())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Tabla de transposiciones para la busqueda de SmartMoveFinder. Guarda para cada posicion (por su clave Zobrist) la
+profundidad a la que se busco, la puntuacion, el tipo de cota y el mejor movimiento encontrado.
+El tamaño se da en MB y toda la memoria se reserva al crearla en arrays de tamaño fijo, asi no crece durante la partida.
+Cada cubeta tiene dos entradas: la primera se queda con la busqueda mas profunda y la segunda se reemplaza siempre.
+"""
+
+from array import array
+
+# Tipos de cota de la puntuacion guardada
+EXACT = 0 # La puntuacion es exacta
+LOWER_BOUND = 1 # Hubo corte beta, la puntuacion real es mayor o igual
+UPPER_BOUND = 2 # Ningun movimiento supero alpha, la puntuacion real es menor o igual
+
+ENTRY_BYTES = 24 # Clave (8 bytes) + puntuacion (8 bytes) + profundidad, cota, edad y movimiento (8 bytes)
+ENTRIES_PER_BUCKET = 2
+
+class TranspositionTable():
+    def __init__(self, sizeMB=16):
+        self.numBuckets = max(1, sizeMB * 1024 * 1024 // (ENTRY_BYTES * ENTRIES_PER_BUCKET))
+        numEntries = self.numBuckets * ENTRIES_PER_BUCKET
+        # array * n rellena con ceros sin crear antes un bytes del mismo tamaño (se crea al importar SmartMoveFinder)
+        self.keys = array('Q', [0]) * numEntries
+        self.scores = array('d', [0.0]) * numEntries
+        # Profundidad (8 bits), cota (2 bits), edad (8 bits) y movimiento + 1 (0 si no hay movimiento)
+        self.data = array('Q', [0]) * numEntries
+        self.age = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0 # La posicion estaba en la tabla
+        self.misses = 0 # La cubeta estaba vacia
+        self.collisions = 0 # La cubeta tenia otras posiciones
+        self.stores = 0
+
+    """
+    Vaciar la tabla (por ejemplo al empezar una partida nueva)
+    """
+    def clear(self):
+        numEntries = len(self.keys)
+        self.keys = array('Q', [0]) * numEntries
+        self.scores = array('d', [0.0]) * numEntries
+        self.data = array('Q', [0]) * numEntries
+        self.age = 0
+        self.resetStats()
+
+    """
+    Llamar antes de cada busqueda para que las entradas de busquedas anteriores se puedan reemplazar
+    """
+    def newSearch(self):
+        self.age = (self.age + 1) & 0xFF
+
+    """
+    Devuelve (profundidad, puntuacion, cota, moveID del mejor movimiento o None) o None si la posicion no esta
+    """
+    def probe(self, key):
+        index = (key % self.numBuckets) * ENTRIES_PER_BUCKET
+        keys = self.keys
+        for i in range(index, index + ENTRIES_PER_BUCKET):
+            if keys[i] == key and self.data[i] != 0:
+                self.hits += 1
+                data = self.data[i]
+                moveCode = data >> 18
+                return data & 0xFF, self.scores[i], (data >> 8) & 0x3, moveCode - 1 if moveCode else None
+        if self.data[index] == 0 and self.data[index + 1] == 0:
+            self.misses += 1
+        else:
+            self.collisions += 1
+        return None
+
+    """
+    Igual que probe pero sin contar en las estadisticas (para leer la tabla fuera de la busqueda, por ejemplo la variante
+    principal)
+    """
+    def peek(self, key):
+        index = (key % self.numBuckets) * ENTRIES_PER_BUCKET
+        for i in range(index, index + ENTRIES_PER_BUCKET):
+            if self.keys[i] == key and self.data[i] != 0:
+                data = self.data[i]
+                moveCode = data >> 18
+                return data & 0xFF, self.scores[i], (data >> 8) & 0x3, moveCode - 1 if moveCode else None
+        return None
+
+    """
+    Guarda una posicion. La primera entrada de la cubeta se reemplaza si la nueva busqueda es igual o mas profunda, si es
+    la misma posicion o si la entrada es de una busqueda anterior. Si no, se guarda en la segunda entrada
+    """
+    def store(self, key, depth, score, bound, bestMove):
+        # Solo se guardan busquedas de profundidad >= 1, asi data nunca es 0 en una entrada usada
+        index = (key % self.numBuckets) * ENTRIES_PER_BUCKET
+        data = self.data[index]
+        if data == 0 or self.keys[index] == key or depth >= data & 0xFF or (data >> 10) & 0xFF != self.age:
+            slot = index
+        else:
+            slot = index + 1
+        moveCode = bestMove.moveID + 1 if bestMove is not None else 0
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.data[slot] = depth | bound << 8 | self.age << 10 | moveCode << 18
+        self.stores += 1
+
+    """
+    Estadisticas de uso de la tabla
+    """
+    def getStats(self):
+        probes = self.hits + self.misses + self.collisions
+        return {"hits": self.hits, "misses": self.misses, "collisions": self.collisions, "stores": self.stores,
+                "hitRate": self.hits / probes if probes else 0.0,
+                "sizeMB": len(self.keys) * ENTRY_BYTES / (1024 * 1024)}
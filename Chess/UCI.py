@@ -0,0 +1,241 @@
+"""
+Motor en modo UCI (Universal Chess Interface) por la entrada y salida estandar, sin ventana. Sirve para jugar con la IA
+desde cualquier interfaz o gestor de torneos (cutechess, Arena...) o para probarla en servidores sin pantalla.
+Solo importa ChessEngine y SmartMoveFinder (nada de pygame ni easygui), asi arranca rapido.
+Uso: python -m Chess.UCI
+"""
+
+import sys
+import threading
+import time
+from Chess import ChessEngine, SmartMoveFinder
+
+ENGINE_NAME = "Masterchess"
+ENGINE_AUTHOR = "jorgeoj"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MOVES_TO_GO = 30 # Movimientos que se supone que quedan cuando el reloj no lo dice (para repartir el tiempo)
+MOVE_OVERHEAD_MS = 50 # Margen para no perder por tiempo (comunicacion con la interfaz)
+
+'''
+Escribe una linea para la interfaz
+'''
+def send(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+'''
+Movimiento en notacion UCI (casilla de origen y destino, mas la pieza si es promocion). El motor siempre promociona a
+reina
+'''
+def moveToUCI(move):
+    return move.getChessNotation() + ('q' if move.isPawnPromotion else '')
+
+'''
+Busca el movimiento en notacion UCI entre los movimientos validos. El motor solo sabe promocionar a reina, asi que las
+promociones a otra pieza (e7e8n) no se aceptan y devuelven None, igual que un movimiento ilegal
+'''
+def moveFromUCI(gs, text):
+    if len(text) not in (4, 5) or (len(text) == 5 and text[4] != 'q'):
+        return None
+    for move in gs.getValidMoves():
+        if move.getChessNotation() == text[:4] and (len(text) == 5) == move.isPawnPromotion:
+            return move
+    return None
+
+'''
+Puntuacion para la linea info: "cp N" o "mate N" si la busqueda ha encontrado un mate (en N movimientos propios, negativo
+si es el motor el que recibe el mate). La puntuacion de mate no lleva la distancia, asi que se saca de la variante principal.
+Si la variante se corta antes del mate (no esta en la tabla de transposiciones) se da como minimo mate 1 o mate -1, ya que
+mate 0 no es valido
+'''
+def scoreToUCI(score, pv):
+    if score >= SmartMoveFinder.CHECKMATE_POINTS:
+        return "mate %d" % max(1, (len(pv) + 1) // 2)
+    elif score <= -SmartMoveFinder.CHECKMATE_POINTS:
+        return "mate %d" % -max(1, len(pv) // 2)
+    return "cp %d" % round(score * 100)
+
+class UCIEngine():
+    def __init__(self, bitboards=False):
+        self.bitboards = bitboards
+        self.gs = ChessEngine.GameState(bitboards)
+        self.searchThread = None
+        self.stopEvent = None
+        self.releaseEvent = None # Con go infinite o go ponder el bestmove espera a stop o ponderhit
+        self.ponderTimeLimit = None # Tiempo de la busqueda cuando llegue ponderhit
+        self.infinite = False
+
+    """
+    position [startpos | fen <fen>] [moves <m1> <m2> ...]
+    """
+    def position(self, args):
+        if args and args[0] == "startpos":
+            fen = START_FEN
+            args = args[1:]
+        elif args and args[0] == "fen":
+            end = args.index("moves") if "moves" in args else len(args)
+            fen = " ".join(args[1:end])
+            args = args[end:]
+        else:
+            return
+        try:
+            gs = ChessEngine.GameState(self.bitboards, fen)
+            if args and args[0] == "moves":
+                for text in args[1:]:
+                    move = moveFromUCI(gs, text)
+                    if move is None:
+                        send("info string movimiento no valido " + text)
+                        break
+                    gs.makeMove(move)
+        except Exception as error: # Se queda la posicion anterior
+            send("info string posicion no valida: %s: %s" % (type(error).__name__, error))
+            return
+        self.gs = gs
+
+    """
+    go [depth N] [movetime MS] [nodes N] [wtime MS btime MS winc MS binc MS movestogo N] [infinite] [ponder]
+    La busqueda va en otro hilo para poder seguir leyendo (stop, ponderhit, quit). Con infinite y ponder no se manda el
+    bestmove hasta que llegue stop o ponderhit, aunque la busqueda termine antes
+    """
+    def go(self, args):
+        self.stop()
+        options = {}
+        i = 0
+        while i < len(args):
+            if args[i] in ("infinite", "ponder"):
+                options[args[i]] = True
+                i += 1
+            elif i + 1 < len(args):
+                try:
+                    options[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                i += 1
+
+        maxDepth = options.get("depth", SmartMoveFinder.MAX_DEPTH if "infinite" not in options and
+                               "ponder" not in options else 64)
+        timeLimit = options.get("movetime")
+        clock = options.get("wtime" if self.gs.whiteToMove else "btime")
+        if timeLimit is None and clock is not None and "infinite" not in options:
+            increment = options.get("winc" if self.gs.whiteToMove else "binc", 0)
+            timeLimit = clock / options.get("movestogo", MOVES_TO_GO) + increment * 3 / 4
+            timeLimit = max(1, min(timeLimit, clock - MOVE_OVERHEAD_MS))
+        if timeLimit is None and "depth" not in options and "nodes" not in options and "infinite" not in options:
+            timeLimit = SmartMoveFinder.TIME_LIMIT_MS
+
+        self.stopEvent = threading.Event()
+        self.releaseEvent = threading.Event()
+        if "infinite" not in options and "ponder" not in options:
+            self.releaseEvent.set()
+        # Mientras se piensa en el turno del rival no hay limite de tiempo, se pone al llegar ponderhit
+        self.ponderTimeLimit = timeLimit
+        self.infinite = "infinite" in options
+        if "ponder" in options:
+            timeLimit = None
+        self.searchThread = threading.Thread(target=self.search, args=(maxDepth, timeLimit, options.get("nodes"),
+                                                                       self.stopEvent, self.releaseEvent), daemon=True)
+        self.searchThread.start()
+
+    """
+    Lo que hace el hilo de la busqueda. Siempre manda un bestmove (0000 si no hay movimientos), aunque la busqueda falle,
+    para que la interfaz no se quede esperando
+    """
+    def search(self, maxDepth, timeLimit, nodeLimit, stopEvent, releaseEvent):
+        gs = self.gs
+        startTime = time.perf_counter()
+
+        def onDepth(depth, score, move):
+            elapsed = time.perf_counter() - startTime
+            nodes = SmartMoveFinder.nodeCount
+            pv = SmartMoveFinder.getPrincipalVariation(gs, move, depth) if move is not None else []
+            send("info depth %d score %s nodes %d nps %d time %d%s" %
+                 (depth, scoreToUCI(score, pv), nodes, nodes / elapsed if elapsed > 0 else 0, elapsed * 1000,
+                  " pv " + " ".join(moveToUCI(pvMove) for pvMove in pv) if pv else ""))
+
+        bestMove = None
+        validMoves = []
+        moveLogLength = len(gs.moveLog)
+        try:
+            validMoves = gs.getValidMoves()
+            if validMoves:
+                bestMove = SmartMoveFinder.findBestMove(gs, validMoves, maxDepth, timeLimit, nodeLimit, shuffle=False,
+                                                        stopEvent=stopEvent, onDepth=onDepth)
+        except Exception as error:
+            send("info string error en la busqueda: %s: %s" % (type(error).__name__, error))
+            # Deshacer los movimientos que se quedaron hechos para que la posicion siga siendo la de position
+            while len(gs.moveLog) > moveLogLength:
+                gs.undoMove()
+        if bestMove is None and validMoves:
+            bestMove = validMoves[0]
+        releaseEvent.wait() # go infinite y go ponder: el bestmove solo se manda despues de stop o ponderhit
+        send("bestmove " + (moveToUCI(bestMove) if bestMove is not None else "0000"))
+
+    """
+    El rival ha jugado el movimiento sobre el que se estaba pensando: la busqueda sigue con el tiempo que le tocaba
+    """
+    def ponderHit(self):
+        if self.searchThread is not None and not self.releaseEvent.is_set():
+            if self.ponderTimeLimit is not None:
+                SmartMoveFinder.ponderHit(self.ponderTimeLimit)
+            if not self.infinite:
+                self.releaseEvent.set()
+
+    """
+    Corta la busqueda en marcha y espera a que mande su bestmove
+    """
+    def stop(self):
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            self.releaseEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+    """
+    Procesa una linea de la interfaz. Devuelve False con quit
+    """
+    def handle(self, line):
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == "uci":
+            send("id name " + ENGINE_NAME)
+            send("id author " + ENGINE_AUTHOR)
+            send("uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            SmartMoveFinder.transpositionTable.clear()
+            self.gs = ChessEngine.GameState(self.bitboards)
+        elif command == "position":
+            self.stop()
+            self.position(args)
+        elif command == "go":
+            self.go(args)
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            return False
+        return True
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m Chess.UCI", description="Motor de ajedrez con protocolo UCI")
+    parser.add_argument("--bitboards", action="store_true", help="generar los movimientos con bitboards")
+    args = parser.parse_args(argv)
+
+    engine = UCIEngine(args.bitboards)
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stop()
+
+if __name__ == "__main__":
+    main()
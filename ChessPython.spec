@@ -5,8 +5,8 @@ a = Analysis(
     ['Chess\\ChessMain.py'],
     pathex=[],
     binaries=[],
-    datas=[],
-    hiddenimports=[],
+    datas=[('Chess\\images\\*.png', 'Chess\\images')],
+    hiddenimports=['Chess.images'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],